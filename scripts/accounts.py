@@ -5,38 +5,96 @@
 """
 
 import os
+import copy
 import json
 import argparse
+import tempfile
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # 路径常量
 SKILL_DIR = Path(__file__).parent.parent
 DATA_DIR = SKILL_DIR / 'data'
 ACCOUNTS_FILE = DATA_DIR / 'accounts.json'
 BROWSER_DATA_DIR = SKILL_DIR / 'browser_data'
 
-# 确保目录存在
-DATA_DIR.mkdir(exist_ok=True)
-BROWSER_DATA_DIR.mkdir(exist_ok=True)
+# 目录按需创建（只读命令不需要 mkdir）
+_dirs_ready = False
+
+# 进程内缓存：accounts.json 的 mtime/size 未变时直接复用已解析的数据
+_CACHE = {'mtime': None, 'size': None, 'data': None}
+
+
+def _ensure_dirs():
+    """首次写入前创建数据目录，之后直接跳过"""
+    global _dirs_ready
+    if not _dirs_ready:
+        DATA_DIR.mkdir(exist_ok=True)
+        _dirs_ready = True
+
+
+def _loads(raw):
+    """解析 JSON 字节串（优先 orjson）"""
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(data):
+    """序列化为紧凑的 UTF-8 JSON 字节串（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _update_cache(st, data):
+    """用最新的文件状态和数据刷新缓存"""
+    _CACHE['mtime'] = st.st_mtime_ns
+    _CACHE['size'] = st.st_size
+    _CACHE['data'] = copy.deepcopy(data)
 
 
 def load_accounts():
-    """加载账号数据"""
-    if not ACCOUNTS_FILE.exists():
+    """加载账号数据（按 mtime + size 命中进程内缓存）"""
+    try:
+        st = ACCOUNTS_FILE.stat()
+    except FileNotFoundError:
         return {'accounts': {}, 'current': None}
-    
+
+    if (_CACHE['data'] is not None
+            and _CACHE['mtime'] == st.st_mtime_ns
+            and _CACHE['size'] == st.st_size):
+        # 返回副本，调用方修改不会污染缓存
+        return copy.deepcopy(_CACHE['data'])
+
     try:
-        with open(ACCOUNTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(ACCOUNTS_FILE, 'rb') as f:
+            data = _loads(f.read())
     except Exception:
         return {'accounts': {}, 'current': None}
 
+    _update_cache(st, data)
+    return data
+
 
 def save_accounts(data):
-    """保存账号数据"""
-    with open(ACCOUNTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """保存账号数据（临时文件 + os.replace 原子替换），并同步刷新进程内缓存"""
+    _ensure_dirs()
+    with tempfile.NamedTemporaryFile('wb', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        f.write(_dumps(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, ACCOUNTS_FILE)
+    _update_cache(ACCOUNTS_FILE.stat(), data)
+
+
+def _err(msg):
+    """构造失败结果"""
+    return {'success': False, 'error': msg}
 
 
 def add_account(account_id, name):
@@ -53,10 +111,7 @@ def add_account(account_id, name):
     data = load_accounts()
     
     if account_id in data['accounts']:
-        return {
-            'success': False,
-            'error': f'账号 {account_id} 已存在'
-        }
+        return _err(f'账号 {account_id} 已存在')
     
     # 创建账号记录
     account = {
@@ -67,9 +122,8 @@ def add_account(account_id, name):
         'last_used_at': None
     }
     
-    # 创建独立的浏览器数据目录
-    account_browser_dir = Path(account['browser_data_dir'])
-    account_browser_dir.mkdir(parents=True, exist_ok=True)
+    # 创建独立的浏览器数据目录（makedirs 自身即存在性检查）
+    os.makedirs(account['browser_data_dir'], exist_ok=True)
     
     data['accounts'][account_id] = account
     
@@ -89,12 +143,11 @@ def add_account(account_id, name):
 def list_accounts():
     """列出所有账号"""
     data = load_accounts()
-    accounts = []
-    
-    for account_id, account in data['accounts'].items():
-        account_info = account.copy()
-        account_info['is_current'] = (account_id == data['current'])
-        accounts.append(account_info)
+    current = data['current']
+    accounts = [
+        {**account, 'is_current': account_id == current}
+        for account_id, account in data['accounts'].items()
+    ]
     
     return {
         'accounts': accounts,
@@ -116,10 +169,7 @@ def switch_account(account_id):
     data = load_accounts()
     
     if account_id not in data['accounts']:
-        return {
-            'success': False,
-            'error': f'账号 {account_id} 不存在'
-        }
+        return _err(f'账号 {account_id} 不存在')
     
     # 更新当前账号
     old_current = data['current']
@@ -153,22 +203,19 @@ def remove_account(account_id, keep_data=False):
     data = load_accounts()
     
     if account_id not in data['accounts']:
-        return {
-            'success': False,
-            'error': f'账号 {account_id} 不存在'
-        }
+        return _err(f'账号 {account_id} 不存在')
     
     account = data['accounts'][account_id]
     
     # 删除浏览器数据目录（如果不保留）
     if not keep_data:
-        browser_dir = Path(account['browser_data_dir'])
-        if browser_dir.exists():
-            import shutil
-            try:
-                shutil.rmtree(browser_dir)
-            except Exception as e:
-                print(f"警告：删除浏览器数据目录失败: {e}")
+        import shutil
+        try:
+            shutil.rmtree(account['browser_data_dir'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"警告：删除浏览器数据目录失败: {e}")
     
     # 从账号列表中删除
     del data['accounts'][account_id]
@@ -282,6 +329,16 @@ def cmd_current(args):
     return 0
 
 
+# 子命令 → 处理函数
+_DISPATCH = {
+    'add': cmd_add,
+    'list': cmd_list,
+    'switch': cmd_switch,
+    'remove': cmd_remove,
+    'current': cmd_current,
+}
+
+
 def main():
     parser = argparse.ArgumentParser(description='小红书多账号管理')
     sub = parser.add_subparsers(dest='command', help='可用命令')
@@ -308,19 +365,11 @@ def main():
 
     args = parser.parse_args()
 
-    if args.command == 'add':
-        return cmd_add(args)
-    elif args.command == 'list':
-        return cmd_list(args)
-    elif args.command == 'switch':
-        return cmd_switch(args)
-    elif args.command == 'remove':
-        return cmd_remove(args)
-    elif args.command == 'current':
-        return cmd_current(args)
-    else:
+    handler = _DISPATCH.get(args.command)
+    if handler is None:
         parser.print_help()
         return 1
+    return handler(args)
 
 
 if __name__ == '__main__':
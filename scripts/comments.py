@@ -4,14 +4,28 @@
 通过 Playwright 抓取小红书笔记评论，用 AI 生成个性化回复
 """
 
+import os
 import json
 import time
+import random
+import signal
+import hashlib
 import logging
 import re
 import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 log = logging.getLogger(__name__)
 
 SKILL_DIR = Path(__file__).parent.parent
@@ -19,41 +33,104 @@ DATA_DIR = SKILL_DIR / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 
 COMMENTS_DB = DATA_DIR / 'comments.json'
+# 只保留最近 2000 条已回复记录，防止文件过大
+MAX_REPLIED = 2000
+# 单条回复的输出上限：回复本身不到 100 字，但思考型模型（Gemini 2.5）的思考 token 也计入上限，
+# 留足余量避免被截断成空内容或半句话
+REPLY_MAX_TOKENS = 1024
 XHS_CREATOR = 'https://creator.xiaohongshu.com'
 XHS_COMMENTS = 'https://creator.xiaohongshu.com/comment'
 
+# 页面元素选择器（fetch_comments 与 reply_to_comment 共用，避免两处漂移）
+ITEM_SEL = '.comment-item, [class*="comment-item"], [class*="CommentItem"]'
+ITEM_FALLBACK_SEL = '.comment-container > div, .comment-list > div'
+CONTENT_SEL = '[class*="content"], .comment-content, .note-comment'
+AUTHOR_SEL = '[class*="author"], [class*="nickname"], [class*="user-name"]'
+TITLE_SEL = '[class*="note-title"], [class*="title"]'
+TIME_SEL = '[class*="time"], time, [class*="date"]'
+REPLY_INPUT_SEL = '[contenteditable="true"], textarea[placeholder*="回复"], input[placeholder*="回复"]'
+
+_ITEM_FIELD_SELS = {
+    'item': ITEM_SEL,
+    'fallback': ITEM_FALLBACK_SEL,
+    'content': CONTENT_SEL,
+    'author': AUTHOR_SEL,
+    'title': TITLE_SEL,
+    'time': TIME_SEL,
+}
+
+# 在页面内一次性提取评论项的文本字段
+# start: 跳过前面已处理过的评论项，只返回新加载的部分
+_EXTRACT_COMMENTS_JS = """({start, sel}) => {
+    let els = document.querySelectorAll(sel.item);
+    if (!els.length) els = document.querySelectorAll(sel.fallback);
+    const text = (el, s) => { const n = el.querySelector(s); return n ? n.innerText : ''; };
+    return Array.from(els).slice(start).map((el, i) => ({
+        index: start + i,
+        content: text(el, sel.content),
+        author: text(el, sel.author),
+        title: text(el, sel.title),
+        time: text(el, sel.time),
+    }));
+}"""
+
 
 def _load_db():
     """加载评论数据库"""
+    db = None
     if COMMENTS_DB.exists():
         try:
-            with open(COMMENTS_DB, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(COMMENTS_DB, 'rb') as f:
+                raw = f.read()
+            db = orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
         except (json.JSONDecodeError, IOError):
             pass
-    return {"replied": [], "stats": {"total_fetched": 0, "total_replied": 0}}
+    if db is None:
+        db = {"replied": [], "stats": {"total_fetched": 0, "total_replied": 0}}
+    # 环形缓冲区自动淘汰最旧记录；集合索引让已回复判断 O(1)，不写入文件
+    db['replied'] = deque(db.get('replied', []), maxlen=MAX_REPLIED)
+    db['_replied_set'] = set(db['replied'])
+    return db
 
 
 def _save_db(db):
     """保存评论数据库"""
-    with open(COMMENTS_DB, 'w', encoding='utf-8') as f:
-        json.dump(db, f, ensure_ascii=False, indent=2)
+    data = {k: v for k, v in db.items() if k != '_replied_set'}
+    data['replied'] = list(db['replied'])
+    # 先写临时文件再原子替换，避免并发或中断时留下半截 JSON
+    if HAS_ORJSON:
+        raw = orjson.dumps(data)
+    else:
+        raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with tempfile.NamedTemporaryFile('wb', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, COMMENTS_DB)
 
 
 def _already_replied(db, comment_id):
     """检查是否已回复过"""
-    return comment_id in db.get('replied', [])
+    return comment_id in db['_replied_set']
+
+
+def _mark_replied(db, comment_id, flush=True):
+    """标记为已回复（flush=False 时只改内存，由调用方统一落盘）"""
+    replied = db['replied']
+    if comment_id not in db['_replied_set']:
+        if len(replied) == replied.maxlen:
+            # 即将被 deque 淘汰的最旧记录同步移出集合
+            db['_replied_set'].discard(replied[0])
+        replied.append(comment_id)
+        db['_replied_set'].add(comment_id)
+    db['stats']['total_replied'] = db['stats'].get('total_replied', 0) + 1
+    if flush:
+        _save_db(db)
 
 
-def _mark_replied(db, comment_id):
-    """标记为已回复"""
-    if comment_id not in db['replied']:
-        db['replied'].append(comment_id)
-        # 只保留最近 2000 条记录，防止文件过大
-        if len(db['replied']) > 2000:
-            db['replied'] = db['replied'][-2000:]
-    db['stats']['total_replied'] = db['stats'].get('total_replied', 0) + 1
-    _save_db(db)
+def _sigterm_to_exit(signum, frame):
+    """SIGTERM 转为 SystemExit，让 auto_reply 的 finally 有机会把数据库落盘"""
+    sys.exit(128 + signum)
 
 
 def fetch_comments(page, limit=20):
@@ -62,13 +139,17 @@ def fetch_comments(page, limit=20):
     返回: [{"id", "author", "content", "note_title", "time", "reply_btn_selector"}]
     """
     log.info(f'正在抓取评论（最多 {limit} 条）...')
-    page.goto(XHS_COMMENTS, wait_until='domcontentloaded', timeout=15000)
+    if page.url.startswith(XHS_COMMENTS):
+        # 已在评论页（repl 模式下连续调用）：刷新以拿到新评论，不能沿用旧 DOM
+        page.reload(wait_until='domcontentloaded', timeout=15000)
+    else:
+        page.goto(XHS_COMMENTS, wait_until='domcontentloaded', timeout=15000)
     time.sleep(3)
 
     # 点击"未回复"筛选（如果有的话）
     try:
         unreplied_tab = page.locator('text=未回复').first
-        if unreplied_tab.is_visible(timeout=3000):
+        if unreplied_tab.is_visible():
             unreplied_tab.click()
             time.sleep(2)
             log.info('已切换到"未回复"评论列表')
@@ -77,69 +158,39 @@ def fetch_comments(page, limit=20):
 
     comments = []
     seen_ids = set()
+    processed = 0  # 已处理的 DOM 评论项数量，滚动后只解析新增部分
 
     # 滚动加载更多评论
     max_scrolls = min(limit // 5 + 1, 10)
     for scroll_i in range(max_scrolls):
-        # 抓取当前可见的评论项
-        items = page.locator('.comment-item, [class*="comment-item"], [class*="CommentItem"]').all()
-        if not items:
-            # 尝试备用选择器
-            items = page.locator('.comment-container > div, .comment-list > div').all()
+        # 一次 evaluate 取回新增评论项的字段，避免逐项逐字段的 CDP 往返
+        items = page.evaluate(_EXTRACT_COMMENTS_JS, {'start': processed, 'sel': _ITEM_FIELD_SELS})
+        processed += len(items)
 
         for item in items:
-            try:
-                # 提取评论文本
-                content_el = item.locator('[class*="content"], .comment-content, .note-comment').first
-                content = content_el.inner_text(timeout=2000).strip() if content_el.is_visible(timeout=1000) else ''
-                if not content:
-                    continue
-
-                # 生成唯一 ID（基于内容哈希）
-                comment_id = str(hash(content))[:12]
-                if comment_id in seen_ids:
-                    continue
-                seen_ids.add(comment_id)
-
-                # 提取作者
-                author = ''
-                try:
-                    author_el = item.locator('[class*="author"], [class*="nickname"], [class*="user-name"]').first
-                    author = author_el.inner_text(timeout=1000).strip()
-                except Exception:
-                    pass
-
-                # 提取关联笔记标题
-                note_title = ''
-                try:
-                    title_el = item.locator('[class*="note-title"], [class*="title"]').first
-                    note_title = title_el.inner_text(timeout=1000).strip()
-                except Exception:
-                    pass
-
-                # 提取时间
-                comment_time = ''
-                try:
-                    time_el = item.locator('[class*="time"], time, [class*="date"]').first
-                    comment_time = time_el.inner_text(timeout=1000).strip()
-                except Exception:
-                    pass
-
-                comments.append({
-                    "id": comment_id,
-                    "author": author,
-                    "content": content,
-                    "note_title": note_title,
-                    "time": comment_time,
-                    "_item_index": len(comments),
-                })
-
-                if len(comments) >= limit:
-                    break
-            except Exception as e:
-                log.debug(f'解析评论项失败: {e}')
+            content = (item.get('content') or '').strip()
+            if not content:
                 continue
 
+            # 生成唯一 ID（基于内容的稳定哈希，跨进程一致，去重才有效）
+            comment_id = hashlib.blake2b(content.encode('utf-8'), digest_size=6).hexdigest()
+            if comment_id in seen_ids:
+                continue
+            seen_ids.add(comment_id)
+
+            comments.append({
+                "id": comment_id,
+                "author": (item.get('author') or '').strip(),
+                "content": content,
+                "note_title": (item.get('title') or '').strip(),
+                "time": (item.get('time') or '').strip(),
+                # 页面上的 DOM 序号，reply_to_comment 按它定位评论项
+                "_item_index": item['index'],
+            })
+
+            if len(comments) >= limit:
+                break
+
         if len(comments) >= limit:
             break
 
@@ -151,23 +202,53 @@ def fetch_comments(page, limit=20):
     return comments[:limit]
 
 
+# 回复风格描述
+REPLY_STYLES = {
+    'friendly': '友好亲切、有温度，像朋友聊天一样',
+    'professional': '专业有深度，体现知识储备',
+    'humorous': '幽默风趣，适当用网络流行语和 emoji',
+    'brief': '简短精炼，一两句话回复',
+}
+
+REPLY_RULES = """规则：
+1. 回复要自然、真诚，不要太官方
+2. 长度控制在 10-80 字
+3. 可以适当用 emoji，但不要过多（1-2个）
+4. 如果评论是提问，认真回答
+5. 如果评论是夸赞，真诚感谢
+6. 如果评论是负面的，礼貌回应不要对抗
+7. 不要用"亲"、"宝"等过于商业化的称呼"""
+
+
+_content_gen = None
+
+
+def _get_content_gen():
+    """按需导入 content_gen（复用其 LLM 调用），只导入一次"""
+    global _content_gen
+    if _content_gen is None:
+        scripts_dir = str(Path(__file__).parent)
+        if scripts_dir not in sys.path:
+            sys.path.insert(0, scripts_dir)
+        import content_gen
+        _content_gen = content_gen
+    return _content_gen
+
+
+def _clean_reply(reply):
+    """去掉引号并限制长度"""
+    reply = reply.strip().strip('"').strip("'")
+    if len(reply) > 100:
+        reply = reply[:97] + '...'
+    return reply
+
+
 def generate_reply(comment_content, note_title='', author='', style='friendly'):
     """
     用 AI 生成评论回复
     style: friendly(友好), professional(专业), humorous(幽默), brief(简短)
     """
-    sys.path.insert(0, str(Path(__file__).parent))
-
-    # 复用 content_gen 的 LLM 调用
-    from content_gen import _call_llm
-
-    style_prompts = {
-        'friendly': '友好亲切、有温度，像朋友聊天一样',
-        'professional': '专业有深度，体现知识储备',
-        'humorous': '幽默风趣，适当用网络流行语和 emoji',
-        'brief': '简短精炼，一两句话回复',
-    }
-    style_desc = style_prompts.get(style, style_prompts['friendly'])
+    style_desc = REPLY_STYLES.get(style, REPLY_STYLES['friendly'])
 
     prompt = f"""你是一个小红书博主，需要回复粉丝的评论。
 
@@ -177,30 +258,72 @@ def generate_reply(comment_content, note_title='', author='', style='friendly'):
 
 回复风格要求：{style_desc}
 
-规则：
-1. 回复要自然、真诚，不要太官方
-2. 长度控制在 10-80 字
-3. 可以适当用 emoji，但不要过多（1-2个）
-4. 如果评论是提问，认真回答
-5. 如果评论是夸赞，真诚感谢
-6. 如果评论是负面的，礼貌回应不要对抗
-7. 不要用"亲"、"宝"等过于商业化的称呼
+{REPLY_RULES}
 8. 直接输出回复内容，不要加引号或前缀
 
 回复："""
 
     try:
-        reply = _call_llm(prompt, max_tokens=200)
-        reply = reply.strip().strip('"').strip("'")
-        # 限制长度
-        if len(reply) > 100:
-            reply = reply[:97] + '...'
-        return reply
+        return _clean_reply(_get_content_gen()._call_llm(prompt, max_tokens=REPLY_MAX_TOKENS))
     except Exception as e:
         log.error(f'AI 生成回复失败: {e}')
         return None
 
 
+def generate_replies_batch(comments, style='friendly'):
+    """
+    一次 LLM 调用为多条评论生成回复
+    comments: fetch_comments 返回的评论列表
+    返回: 与 comments 一一对应的回复列表（失败项为 None）
+    批量结果解析失败或条数不符时，降级为并发逐条调用 generate_reply
+    """
+    if not comments:
+        return []
+    if len(comments) == 1:
+        c = comments[0]
+        return [generate_reply(c['content'], c.get('note_title', ''), c.get('author', ''), style)]
+
+    cg = _get_content_gen()
+    style_desc = REPLY_STYLES.get(style, REPLY_STYLES['friendly'])
+    listing = '\n\n'.join(
+        f"[{i}] 笔记标题：{c.get('note_title') or '(未知)'}\n"
+        f"    粉丝昵称：{c.get('author') or '(匿名)'}\n"
+        f"    评论内容：{c['content']}"
+        for i, c in enumerate(comments, 1)
+    )
+
+    prompt = f"""你是一个小红书博主，需要逐条回复下面 {len(comments)} 条粉丝评论。
+
+{listing}
+
+回复风格要求：{style_desc}
+
+{REPLY_RULES}
+8. 每条评论单独回复，按编号顺序输出
+
+严格只输出 JSON：{{"replies": ["第1条的回复", "第2条的回复", ...]}}，共 {len(comments)} 条。"""
+
+    try:
+        raw = cg._call_llm(prompt, max_tokens=REPLY_MAX_TOKENS + 200 * len(comments))
+        replies = cg.extract_json(raw).get('replies')
+        if isinstance(replies, list) and len(replies) == len(comments):
+            return [_clean_reply(r) if isinstance(r, str) and r.strip() else None for r in replies]
+        log.warning('批量回复条数不匹配，降级为逐条生成')
+    except Exception as e:
+        log.warning(f'批量生成回复失败，降级为逐条生成: {e}')
+
+    return _generate_replies_parallel(comments, style)
+
+
+def _generate_replies_parallel(comments, style):
+    """逐条生成回复，LLM 请求彼此独立，用线程池并发发出"""
+    def _one(c):
+        return generate_reply(c['content'], c.get('note_title', ''), c.get('author', ''), style)
+
+    with ThreadPoolExecutor(max_workers=min(8, len(comments))) as ex:
+        return list(ex.map(_one, comments))
+
+
 def reply_to_comment(page, comment_index, reply_text):
     """
     在页面上回复指定评论
@@ -208,9 +331,9 @@ def reply_to_comment(page, comment_index, reply_text):
     reply_text: 回复内容
     """
     try:
-        items = page.locator('.comment-item, [class*="comment-item"], [class*="CommentItem"]').all()
+        items = page.locator(ITEM_SEL).all()
         if not items:
-            items = page.locator('.comment-container > div, .comment-list > div').all()
+            items = page.locator(ITEM_FALLBACK_SEL).all()
 
         if comment_index >= len(items):
             log.error(f'评论索引 {comment_index} 超出范围（共 {len(items)} 条）')
@@ -220,7 +343,7 @@ def reply_to_comment(page, comment_index, reply_text):
 
         # 点击回复按钮
         reply_btn = item.locator('text=回复').first
-        if not reply_btn.is_visible(timeout=3000):
+        if not reply_btn.is_visible():
             # 尝试 hover 触发回复按钮
             item.hover()
             time.sleep(0.5)
@@ -230,18 +353,17 @@ def reply_to_comment(page, comment_index, reply_text):
         time.sleep(0.5)
 
         # 找到输入框并输入
-        input_box = page.locator('[contenteditable="true"], textarea[placeholder*="回复"], input[placeholder*="回复"]').last
+        input_box = page.locator(REPLY_INPUT_SEL).last
         input_box.click()
         time.sleep(0.3)
 
-        # 逐字输入避免触发反作弊
-        for char in reply_text:
-            input_box.type(char, delay=50)
-        time.sleep(0.5)
+        # 一次性填入，再随机停顿模拟人工检查后发送
+        input_box.fill(reply_text)
+        time.sleep(random.uniform(0.4, 1.2))
 
         # 点击发送
         send_btn = page.locator('text=发送').last
-        if send_btn.is_visible(timeout=2000):
+        if send_btn.is_visible():
             send_btn.click()
         else:
             # 尝试按回车发送
@@ -273,21 +395,35 @@ def auto_reply(page, limit=10, style='friendly', dry_run=False):
         "details": []
     }
 
-    for comment in comments:
-        cid = comment['id']
+    # 回复过程中只改内存，结束时统一写一次；Ctrl-C / SIGTERM 也会走 finally 落盘
+    old_sigterm = None
+    if threading.current_thread() is threading.main_thread():
+        old_sigterm = signal.signal(signal.SIGTERM, _sigterm_to_exit)
+
+    try:
+        _reply_loop(page, db, comments, results, style, dry_run)
+    finally:
+        _save_db(db)
+        if old_sigterm is not None:
+            signal.signal(signal.SIGTERM, old_sigterm)
+    return results
+
 
+def _reply_loop(page, db, comments, results, style, dry_run):
+    """先过滤已回复的评论，批量生成回复后逐条发送，结果写入 results"""
+    pending = []
+    for comment in comments:
         # 跳过已回复的
-        if _already_replied(db, cid):
+        if _already_replied(db, comment['id']):
             results['skipped'] += 1
-            continue
+        else:
+            pending.append(comment)
 
-        # 生成回复
-        reply = generate_reply(
-            comment_content=comment['content'],
-            note_title=comment.get('note_title', ''),
-            author=comment.get('author', ''),
-            style=style,
-        )
+    # 一次 LLM 调用生成全部回复
+    replies = generate_replies_batch(pending, style=style)
+
+    for comment, reply in zip(pending, replies):
+        cid = comment['id']
 
         if not reply:
             results['failed'] += 1
@@ -311,7 +447,7 @@ def auto_reply(page, limit=10, style='friendly', dry_run=False):
             # 实际回复
             success = reply_to_comment(page, comment['_item_index'], reply)
             if success:
-                _mark_replied(db, cid)
+                _mark_replied(db, cid, flush=False)
                 results['replied'] += 1
                 detail['status'] = 'sent'
                 # 间隔 3-5 秒，避免频率过高
@@ -322,9 +458,6 @@ def auto_reply(page, limit=10, style='friendly', dry_run=False):
 
         results['details'].append(detail)
 
-    _save_db(db)
-    return results
-
 
 def get_reply_stats():
     """获取回复统计"""
@@ -356,6 +489,43 @@ def format_reply_results(results):
     return "\n".join(lines)
 
 
+def run_repl(page, stream=None):
+    """
+    持久模式：逐行读取 JSON 命令，复用同一个浏览器页面执行
+    命令示例: {"action": "fetch", "limit": 10}
+              {"action": "reply", "limit": 10, "style": "friendly", "dry_run": true}
+              {"action": "stats"} / {"action": "quit"}
+    每条命令输出一行 JSON 结果
+    """
+    for line in (stream or sys.stdin):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            cmd = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(json.dumps({"success": False, "error": f"无效的 JSON 命令: {e}"}, ensure_ascii=False), flush=True)
+            continue
+
+        action = cmd.get('action')
+        if action in ('quit', 'exit'):
+            break
+        try:
+            if action == 'fetch':
+                out = fetch_comments(page, limit=cmd.get('limit', 10))
+            elif action == 'reply':
+                out = auto_reply(page, limit=cmd.get('limit', 10),
+                                 style=cmd.get('style', 'friendly'),
+                                 dry_run=cmd.get('dry_run', False))
+            elif action == 'stats':
+                out = get_reply_stats()
+            else:
+                out = {"success": False, "error": f"未知命令: {action}"}
+        except Exception as e:
+            out = {"success": False, "error": str(e)}
+        print(json.dumps(out, ensure_ascii=False), flush=True)
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='评论自动互动')
@@ -372,13 +542,16 @@ def main():
 
     p_stats = sub.add_parser('stats', help='回复统计')
 
+    p_repl = sub.add_parser('repl', help='持久模式：从标准输入逐行读取 JSON 命令，复用同一浏览器')
+    p_repl.add_argument('--headless', action='store_true')
+
     args = parser.parse_args()
 
     if args.action == 'stats':
         print(json.dumps(get_reply_stats(), ensure_ascii=False, indent=2))
         return
 
-    if args.action in ('fetch', 'reply'):
+    if args.action in ('fetch', 'reply', 'repl'):
         from playwright.sync_api import sync_playwright
         sys.path.insert(0, str(Path(__file__).parent))
 
@@ -401,6 +574,8 @@ def main():
                 results = auto_reply(page, limit=args.limit, style=args.style, dry_run=args.dry_run)
                 print(format_reply_results(results))
                 print("\n" + json.dumps(results, ensure_ascii=False, indent=2))
+            elif args.action == 'repl':
+                run_repl(page)
 
             ctx.close()
     else:
@@ -10,29 +10,97 @@ import sys
 import json
 import argparse
 import re
+import random
+import threading
+import time
+import hashlib
+import tempfile
+import http.client
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # 路径常量
 SKILL_DIR = Path(__file__).parent.parent
 TEMPLATES_DIR = SKILL_DIR / 'templates'
 CONTENT_DIR = SKILL_DIR / 'content'
 OPENCLAW_CONFIG = Path.home() / '.openclaw' / 'openclaw.json'
+LLM_CACHE_DIR = CONTENT_DIR / '.llm_cache'
+LLM_CACHE_TTL = 7 * 24 * 3600  # 响应缓存有效期（秒）
+LLM_CACHE_VERSION = 2  # 旧版本可能缓存过被截断的输出，升版本使其失效
+TOPIC_INDEX = LLM_CACHE_DIR / 'topics.json'  # 归一化主题 → 生成结果的索引
+TOPIC_INDEX_MAX = 200
+_topic_lock = threading.Lock()
+_NON_WORD_RE = re.compile(r'[\W_]+')
 
 CONTENT_DIR.mkdir(exist_ok=True)
 
 
+def _loads(raw):
+    """解析 JSON 字节串/字符串（优先 orjson）"""
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(data, indent=False):
+    """序列化为 UTF-8 JSON 字节串（优先 orjson），indent 时两空格缩进"""
+    if HAS_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@lru_cache(maxsize=64)
+def _read_json_cached(path_str, mtime_ns):
+    with open(path_str, 'rb') as f:
+        return _loads(f.read())
+
+
+def _read_json(path):
+    """读取 JSON 文件，按 (路径, mtime) 缓存解析结果；返回共享对象，调用方不要修改"""
+    return _read_json_cached(str(path), os.stat(path).st_mtime_ns)
+
+
 def load_config():
     """加载 OpenClaw 配置，获取 API 信息"""
     try:
-        with open(OPENCLAW_CONFIG, 'r') as f:
-            return json.load(f)
+        return _read_json(OPENCLAW_CONFIG)
     except Exception:
         return {}
 
 
 def get_llm_config():
-    """获取 LLM API 配置（优先 Gemini 免费 API，降级百炼）"""
+    """
+    获取 LLM API 配置（优先 Gemini 免费 API，降级百炼）
+    按配置文件 mtime 缓存，返回共享对象，调用方不要修改
+    """
+    try:
+        mtime_ns = os.stat(OPENCLAW_CONFIG).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    return _llm_config_for(mtime_ns)
+
+
+def _max_output_tokens(api_type, model_entry):
+    """模型单次输出上限：优先用配置里模型声明的 maxTokens，否则按 API 类型取保守默认值"""
+    declared = (model_entry or {}).get('maxTokens')
+    if isinstance(declared, int) and declared > 0:
+        return declared
+    return MAX_OUTPUT_ANTHROPIC if 'anthropic' in api_type else MAX_OUTPUT_DEFAULT
+
+
+@lru_cache(maxsize=1)
+def _llm_config_for(config_mtime_ns):
+    """按配置文件版本解析 LLM 配置（mtime 改变时重新解析）"""
     cfg = load_config()
     providers = cfg.get('models', {}).get('providers', {})
 
@@ -52,80 +120,305 @@ def get_llm_config():
             'model': 'gemini-2.5-flash',
             'api_type': 'openai-completions',
             'proxy': 'http://127.0.0.1:7897',
+            # 2.5 系列默认会思考且思考 token 计入 max_tokens：限定思考预算（low ≈ 1024），
+            # 并在输出上限之外补上这部分额度
+            'reasoning_effort': 'low',
+            'thinking_tokens': 1024,
+            'max_output_tokens': 65536,
         }
 
     # 降级百炼
     if 'bailian' in providers:
         p = providers['bailian']
-        model_id = p.get('models', [{}])[0].get('id', 'qwen-plus') if p.get('models') else 'qwen-plus'
+        model_entry = p.get('models', [{}])[0] if p.get('models') else {}
+        model_id = model_entry.get('id', 'qwen-plus') or 'qwen-plus'
+        api_type = p.get('api', 'openai-completions')
         return {
             'base_url': p.get('baseUrl', ''),
             'api_key': p.get('apiKey', ''),
             'model': model_id,
-            'api_type': p.get('api', 'openai-completions'),
+            'api_type': api_type,
+            'max_output_tokens': _max_output_tokens(api_type, model_entry),
         }
 
     # 降级 generic
     if 'generic' in providers:
         p = providers['generic']
-        model_id = p.get('models', [{}])[0].get('id', '') if p.get('models') else ''
+        model_entry = p.get('models', [{}])[0] if p.get('models') else {}
+        model_id = model_entry.get('id', '') or ''
+        api_type = p.get('api', 'openai-completions')
         return {
             'base_url': p.get('baseUrl', ''),
             'api_key': p.get('apiKey', ''),
             'model': model_id,
-            'api_type': p.get('api', 'openai-completions'),
+            'api_type': api_type,
+            'max_output_tokens': _max_output_tokens(api_type, model_entry),
         }
 
     return None
 
 
+@lru_cache(maxsize=1)
+def _template_files(dir_mtime_ns):
+    """
+    模板目录下的 [(id, 文件路径)]，目录内容变化（mtime 改变）时重新扫描
+    冷启动时并发读取解析各模板文件（解析结果同时进入 _read_json 缓存）
+    """
+    def _load_one(f):
+        try:
+            return (_read_json(f).get('id', f.stem), f)
+        except Exception:
+            return None
+
+    files = sorted(TEMPLATES_DIR.glob('*.json'))
+    if not files:
+        return ()
+    with ThreadPoolExecutor(max_workers=min(8, len(files))) as ex:
+        return tuple(e for e in ex.map(_load_one, files) if e is not None)
+
+
+def _template_index():
+    """模板 id → 文件路径 的有序列表"""
+    try:
+        return _template_files(TEMPLATES_DIR.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return ()
+
+
 def list_templates():
     """列出所有可用模板"""
     templates = []
-    if not TEMPLATES_DIR.exists():
-        return templates
-    for f in sorted(TEMPLATES_DIR.glob('*.json')):
+    for _, f in _template_index():
         try:
-            with open(f, 'r', encoding='utf-8') as fh:
-                t = json.load(fh)
-            templates.append({
-                'id': t.get('id', f.stem),
-                'name': t.get('name', f.stem),
-                'description': t.get('description', ''),
-            })
+            t = _read_json(f)
         except Exception:
-            pass
+            continue
+        templates.append({
+            'id': t.get('id', f.stem),
+            'name': t.get('name', f.stem),
+            'description': t.get('description', ''),
+        })
     return templates
 
 
 def load_template(style):
-    """加载指定风格的模板"""
+    """加载指定风格的模板（返回共享的缓存对象，调用方不要修改）"""
     path = TEMPLATES_DIR / f'{style}.json'
     if not path.exists():
         # 尝试按 id 匹配
-        for f in TEMPLATES_DIR.glob('*.json'):
-            try:
-                with open(f, 'r', encoding='utf-8') as fh:
-                    t = json.load(fh)
-                if t.get('id') == style:
-                    return t
-            except Exception:
-                pass
+        for tid, f in _template_index():
+            if tid == style:
+                try:
+                    return _read_json(f)
+                except Exception:
+                    pass
+        return None
+    return _read_json(path)
+
+
+# 每个线程各自缓存的 HTTP 长连接（http.client 连接不能跨线程共用）
+_conn_local = threading.local()
+
+
+def _get_conn(scheme, host, port, proxy, timeout):
+    """取当前线程中 (scheme, host, port, proxy) 对应的长连接，没有则新建"""
+    conns = getattr(_conn_local, 'conns', None)
+    if conns is None:
+        conns = _conn_local.conns = {}
+    key = (scheme, host, port, proxy)
+    conn = conns.get(key)
+    if conn is None:
+        conn_cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        if proxy:
+            p = urllib.parse.urlsplit(proxy)
+            if scheme == 'https':
+                # 经 HTTP 代理 CONNECT 隧道访问 HTTPS
+                conn = http.client.HTTPSConnection(p.hostname, p.port or 80, timeout=timeout)
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.client.HTTPConnection(p.hostname, p.port or 80, timeout=timeout)
+        else:
+            conn = conn_cls(host, port, timeout=timeout)
+        conns[key] = conn
+    return conn, key
+
+
+def _drop_conn(key):
+    """关闭并丢弃当前线程缓存的连接"""
+    conn = getattr(_conn_local, 'conns', {}).pop(key, None)
+    if conn is not None:
+        conn.close()
+
+
+def _http_send(url, data, headers, proxy='', timeout=90):
+    """
+    复用长连接发送 POST 请求，返回尚未读取正文的响应
+    proxy 为空时沿用环境变量中的代理设置（与 urllib 行为一致）
+    返回: (response, conn_key)；调用方读完正文后连接才能复用，读取出错需 _drop_conn(conn_key)
+    """
+    u = urllib.parse.urlsplit(url)
+    scheme = u.scheme
+    port = u.port or (443 if scheme == 'https' else 80)
+    if not proxy:
+        proxy = urllib.request.getproxies().get(scheme, '')
+        if proxy and urllib.request.proxy_bypass(u.hostname):
+            proxy = ''
+    # 经代理访问 HTTP 时需要完整 URL，其余情况只发路径
+    path = url if (proxy and scheme == 'http') else (u.path or '/') + (f'?{u.query}' if u.query else '')
+
+    for attempt in range(2):
+        conn, key = _get_conn(scheme, u.hostname, port, proxy, timeout)
+        try:
+            conn.request('POST', path, body=data, headers=headers)
+            return conn.getresponse(), key
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # 服务端关闭了空闲连接，换新连接重试一次
+            _drop_conn(key)
+            if attempt:
+                raise
+        except Exception:
+            _drop_conn(key)
+            raise
+
+
+def _http_post(url, data, headers, proxy='', timeout=90):
+    """
+    复用长连接发送 POST 请求
+    返回: (status, response_headers, body_bytes)
+    """
+    resp, key = _http_send(url, data, headers, proxy=proxy, timeout=timeout)
+    try:
+        return resp.status, resp.headers, resp.read()
+    except Exception:
+        _drop_conn(key)
+        raise
+
+
+# 输出上限：笔记通常远小于 2048 tokens；被截断时再放宽重试一次
+# 思考型模型的思考 token 另按配置里的 thinking_tokens 追加，不占这里的额度
+# 实际请求时再按各模型的 max_output_tokens 封顶（超出上限的请求会被直接 400 拒绝）
+MAX_TOKENS_DEFAULT = 2048
+MAX_TOKENS_RETRY = 16384
+# 配置未声明模型输出上限时的默认值（Anthropic 旧模型多为 4096）
+MAX_OUTPUT_DEFAULT = 16384
+MAX_OUTPUT_ANTHROPIC = 4096
+# 合并生成时每篇笔记预留的 token 数，以及每次请求的主题数上限（4 篇 × 4096 不超过 MAX_TOKENS_RETRY）
+MULTI_TOPIC_TOKENS = 4096
+MULTI_TOPICS_MAX = 4
+
+# 可重试的 HTTP 状态码（限流 + 服务端临时错误）
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _retry_wait(attempt, resp_headers, cap=60.0):
+    """计算重试等待秒数：优先服务端 Retry-After，否则指数退避 + full jitter"""
+    retry_after = resp_headers.get('Retry-After') if resp_headers else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, 2.0 ** attempt))
+
+
+def _cache_key(model, system_prompt, user_prompt, temperature):
+    """响应缓存键：(版本, 模型, system, user, temperature) 的 sha256"""
+    raw = json.dumps({'v': LLM_CACHE_VERSION, 'm': model, 's': system_prompt, 'u': user_prompt, 't': temperature},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _cache_get(key):
+    """读取未过期的缓存响应，未命中返回 None"""
+    path = LLM_CACHE_DIR / f'{key}.json'
+    try:
+        with open(path, 'rb') as f:
+            entry = _loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('ts', 0) > LLM_CACHE_TTL:
         return None
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return entry.get('text')
+
+
+def _cache_put(key, text):
+    """写入缓存（每个键一个文件，临时文件 + 原子替换）"""
+    try:
+        LLM_CACHE_DIR.mkdir(exist_ok=True)
+        tmp = LLM_CACHE_DIR / f'{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_dumps({'ts': int(time.time()), 'text': text}))
+        os.replace(tmp, LLM_CACHE_DIR / f'{key}.json')
+    except OSError as e:
+        print(f"[LLM] 写入响应缓存失败: {e}", file=sys.stderr)
+
+
+def _normalize_topic(topic):
+    """
+    主题归一化：只去掉标点空白、统一小写
+    不删语气助词等单字——它们常是词的一部分（酒吧/目的地），删掉会把不同主题并成一个
+    """
+    return _NON_WORD_RE.sub('', topic).lower()
 
 
-def call_llm(system_prompt, user_prompt, llm_cfg):
-    """调用 LLM API 生成内容（支持代理和速率限制重试）"""
-    import urllib.request
-    import urllib.error
+def _topic_index_key(topic, style, extra, model):
+    """近似主题索引键"""
+    return '|'.join((style, model, _normalize_topic(extra), _normalize_topic(topic)))
 
+
+def _load_topic_index():
+    """读取近似主题索引 {key: {topic, ts, text}}"""
+    try:
+        with open(TOPIC_INDEX, 'rb') as f:
+            return _loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _lookup_similar_topic(topic, style, extra, model):
+    """
+    查找归一化后相同的已生成主题（同风格、同额外指令、同模型）
+    命中返回 (原主题, LLM 原始输出)，否则 None
+    """
+    entry = _load_topic_index().get(_topic_index_key(topic, style, extra, model))
+    if not entry or time.time() - entry.get('ts', 0) > LLM_CACHE_TTL:
+        return None
+    # 旧版索引按更激进的规则归一化过，键相同但原主题不同的条目不能复用
+    if _normalize_topic(entry.get('topic', '')) != _normalize_topic(topic):
+        return None
+    return entry['topic'], entry['text']
+
+
+def _remember_topic(topic, style, extra, model, text):
+    """把本次生成结果写入近似主题索引（只保留最近 TOPIC_INDEX_MAX 条）"""
+    with _topic_lock:
+        index = _load_topic_index()
+        key = _topic_index_key(topic, style, extra, model)
+        index.pop(key, None)
+        index[key] = {'topic': topic, 'ts': int(time.time()), 'text': text}
+        index = dict(list(index.items())[-TOPIC_INDEX_MAX:])
+        try:
+            LLM_CACHE_DIR.mkdir(exist_ok=True)
+            # 每次写入用唯一临时文件，多进程同时写不会互相覆盖半成品
+            with tempfile.NamedTemporaryFile('wb', dir=LLM_CACHE_DIR, suffix='.tmp', delete=False) as f:
+                f.write(_dumps(index))
+            os.replace(f.name, TOPIC_INDEX)
+        except OSError as e:
+            print(f"[LLM] 写入主题缓存失败: {e}", file=sys.stderr)
+
+
+def _build_llm_request(system_prompt, user_prompt, llm_cfg, max_tokens=None):
+    """
+    按 API 类型构造请求，返回 (url, headers, body)
+    max_tokens 为正文输出上限（None 时用 MAX_TOKENS_DEFAULT），思考型模型再加上 thinking_tokens，
+    合计不超过模型的 max_output_tokens
+    """
     api_type = llm_cfg.get('api_type', 'openai-completions')
+    limit = min((max_tokens or MAX_TOKENS_DEFAULT) + llm_cfg.get('thinking_tokens', 0),
+                llm_cfg.get('max_output_tokens', MAX_OUTPUT_DEFAULT))
     base_url = llm_cfg['base_url'].rstrip('/')
     api_key = llm_cfg['api_key']
     model = llm_cfg['model']
-    proxy = llm_cfg.get('proxy', '')
 
     if 'anthropic' in api_type:
         url = f"{base_url}/v1/messages"
@@ -136,10 +429,13 @@ def call_llm(system_prompt, user_prompt, llm_cfg):
         }
         body = {
             'model': model,
-            'max_tokens': 4096,
-            'system': system_prompt,
+            'max_tokens': limit,
             'messages': [{'role': 'user', 'content': user_prompt}],
         }
+        if system_prompt:
+            # 静态 system 标记为可缓存前缀
+            body['system'] = [{'type': 'text', 'text': system_prompt,
+                               'cache_control': {'type': 'ephemeral'}}]
     else:
         url = f"{base_url}/chat/completions"
         headers = {
@@ -153,65 +449,236 @@ def call_llm(system_prompt, user_prompt, llm_cfg):
                 {'role': 'user', 'content': user_prompt},
             ],
             'temperature': 0.8,
-            'max_tokens': 16384,
+            'max_tokens': limit,
         }
+        if llm_cfg.get('reasoning_effort'):
+            body['reasoning_effort'] = llm_cfg['reasoning_effort']
+    return url, headers, body
 
-    data = json.dumps(body).encode('utf-8')
 
-    # 构建 opener（支持代理）
-    if proxy:
-        proxy_handler = urllib.request.ProxyHandler({'https': proxy, 'http': proxy})
-        opener = urllib.request.build_opener(proxy_handler)
-    else:
-        opener = urllib.request.build_opener()
+def _post_with_retry(url, body, headers, proxy):
+    """
+    发送请求，遇到限流/临时错误按退避策略重试
+    成功返回 (response, conn_key)，正文由调用方读取
+    """
+    data = _dumps(body)
 
-    # 重试逻辑（Gemini 免费 tier 有速率限制）
-    max_retries = 3
+    # 重试逻辑（Gemini 免费 tier 有速率限制；退避带随机抖动，避免并发请求同时重试）
+    max_retries = 5
     for attempt in range(max_retries):
-        req = urllib.request.Request(url, data=data, headers=headers, method='POST')
+        resp, key = _http_send(url, data, headers, proxy=proxy, timeout=90)
+        if resp.status < 400:
+            return resp, key
         try:
-            with opener.open(req, timeout=90) as resp:
-                result = json.loads(resp.read().decode('utf-8'))
-            break
-        except urllib.error.HTTPError as e:
-            err_body = e.read().decode('utf-8', errors='replace')
-            if e.code == 429 and attempt < max_retries - 1:
-                wait = (attempt + 1) * 15
-                print(f"[LLM] 速率限制，等待 {wait}s 后重试 ({attempt+1}/{max_retries})...", file=sys.stderr)
-                import time
-                time.sleep(wait)
-                continue
-            raise RuntimeError(f"LLM API 错误 ({e.code}): {err_body}")
+            err_body = resp.read().decode('utf-8', errors='replace')
+        except Exception:
+            _drop_conn(key)
+            raise
+        if resp.status in RETRYABLE_STATUS and attempt < max_retries - 1:
+            wait = _retry_wait(attempt, resp.headers)
+            print(f"[LLM] 速率限制，等待 {wait:.1f}s 后重试 ({attempt+1}/{max_retries})...", file=sys.stderr)
+            time.sleep(wait)
+            continue
+        raise RuntimeError(f"LLM API 错误 ({resp.status}): {err_body}")
+
+
+def call_llm(system_prompt, user_prompt, llm_cfg, cache=None, max_tokens=None):
+    """
+    调用 LLM API 生成内容（支持代理和速率限制重试，复用 HTTP 长连接）
+
+    cache: True 强制使用响应缓存，False 禁用；None 时仅对低温度（<0.7）请求缓存，
+           高温度生成本就期望每次结果不同
+    max_tokens: 输出上限；None 时先用 MAX_TOKENS_DEFAULT，被截断再以 MAX_TOKENS_RETRY 重试一次
+    显式上限下仍被截断、或返回内容为空时抛 RuntimeError（半截文本不能当作结果使用）
+    """
+    url, headers, body = _build_llm_request(system_prompt, user_prompt, llm_cfg, max_tokens)
+
+    temperature = body.get('temperature', 1.0)
+    if cache is None:
+        cache = temperature < 0.7
+    if cache:
+        key = _cache_key(llm_cfg['model'], system_prompt, user_prompt, temperature)
+        cached = _cache_get(key)
+        if cached is not None:
+            print("[LLM] 命中响应缓存", file=sys.stderr)
+            return cached
+
+    resp, conn_key = _post_with_retry(url, body, headers, llm_cfg.get('proxy', ''))
+    try:
+        result = _loads(resp.read())
+    except Exception:
+        _drop_conn(conn_key)
+        raise
 
     # 提取文本
-    if 'anthropic' in api_type:
-        text = result.get('content', [{}])[0].get('text', '')
+    if 'anthropic' in llm_cfg.get('api_type', 'openai-completions'):
+        text = (result.get('content') or [{}])[0].get('text')
+        truncated = result.get('stop_reason') == 'max_tokens'
     else:
-        text = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-
+        choice = (result.get('choices') or [{}])[0]
+        text = (choice.get('message') or {}).get('content')
+        truncated = choice.get('finish_reason') == 'length'
+
+    if truncated:
+        if max_tokens is None:
+            print(f"[LLM] 输出被截断，以 max_tokens={MAX_TOKENS_RETRY} 重试", file=sys.stderr)
+            return call_llm(system_prompt, user_prompt, llm_cfg, cache=cache, max_tokens=MAX_TOKENS_RETRY)
+        raise RuntimeError(f"LLM 输出被截断（max_tokens={max_tokens}）")
+    if not text:
+        raise RuntimeError("LLM 返回内容为空")
+
+    # 被截断或为空的输出上面已抛错，只有完整结果才会写入缓存
+    if cache:
+        _cache_put(key, text)
     return text
 
 
-def _call_llm(prompt, max_tokens=4096):
+def call_llm_stream(system_prompt, user_prompt, llm_cfg, max_tokens=None, meta=None):
+    """
+    流式调用 LLM（SSE），逐段 yield 生成的文本
+    OpenAI 兼容接口读取 choices[0].delta.content，Anthropic 读取 content_block_delta
+    meta: 可选 dict，输出因 max_tokens 被截断时置 meta['truncated'] = True
+    """
+    url, headers, body = _build_llm_request(system_prompt, user_prompt, llm_cfg, max_tokens)
+    body['stream'] = True
+
+    resp, conn_key = _post_with_retry(url, body, headers, llm_cfg.get('proxy', ''))
+    try:
+        while True:
+            line = resp.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line.startswith(b'data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == b'[DONE]':
+                break
+            try:
+                event = _loads(payload)
+            except ValueError:
+                continue
+            if 'choices' in event:
+                choices = event['choices'] or [{}]
+                piece = (choices[0].get('delta') or {}).get('content')
+                if choices[0].get('finish_reason') == 'length' and meta is not None:
+                    meta['truncated'] = True
+            elif event.get('type') == 'content_block_delta':
+                piece = event.get('delta', {}).get('text')
+            else:
+                piece = None
+                if (event.get('type') == 'message_delta' and meta is not None
+                        and event.get('delta', {}).get('stop_reason') == 'max_tokens'):
+                    meta['truncated'] = True
+            if piece:
+                yield piece
+        # 读完剩余内容，连接才能复用
+        resp.read()
+    except BaseException:
+        # 中途出错或调用方提前停止迭代，连接状态未知，直接丢弃
+        _drop_conn(conn_key)
+        raise
+
+
+def _collect_stream(system_prompt, user_prompt, llm_cfg, max_tokens=None):
+    """
+    流式读取完整回复，每收到一段在 stderr 打印一个进度点
+    未指定 max_tokens 且输出被截断时，以 MAX_TOKENS_RETRY 重新生成一次；
+    显式上限下仍被截断时抛 RuntimeError
+    """
+    parts = []
+    meta = {}
+    for piece in call_llm_stream(system_prompt, user_prompt, llm_cfg, max_tokens, meta):
+        parts.append(piece)
+        print('.', end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    if meta.get('truncated') and max_tokens is None:
+        print(f"[LLM] 输出被截断，以 max_tokens={MAX_TOKENS_RETRY} 重试", file=sys.stderr)
+        return _collect_stream(system_prompt, user_prompt, llm_cfg, max_tokens=MAX_TOKENS_RETRY)
+    if meta.get('truncated'):
+        raise RuntimeError(f"LLM 输出被截断（max_tokens={max_tokens}）")
+    return ''.join(parts)
+
+
+def _call_llm(prompt, max_tokens=None):
     """简易 LLM 调用（供 comments.py 等模块使用）"""
     llm_cfg = get_llm_config()
     if not llm_cfg:
         raise RuntimeError("未找到可用的 LLM 配置")
-    # 临时覆盖 max_tokens
-    orig_call = call_llm
-    import copy
-    cfg = copy.copy(llm_cfg)
-    return orig_call('', prompt, cfg)
+    return call_llm('', prompt, llm_cfg, max_tokens=max_tokens)
+
+
+# AI 创作声明；已以任一标记结尾的正文不再重复追加
+_AI_DISCLAIMER = '📝 本文由 AI 辅助创作'
+_AI_MARK = 'AI辅助创作'
+_AI_MARKS = (_AI_MARK, _AI_DISCLAIMER)
+
+# 标题截断时优先断开的标点/空格
+_TITLE_BREAKS = frozenset('，。！？、·~…—|,!? ')
+
+_TOPIC_LINE_RE = re.compile(r'\n*主题：\{topic\}\n*')
+
+
+def _split_prompt(template):
+    """
+    把模板拆成 (与主题无关的静态指令, 动态后缀模板)
+    静态部分拼进 system，主题放在最后，请求前缀跨调用保持一致，便于服务端前缀缓存
+    模板可显式提供 static_prefix / dynamic_suffix_template；否则从 user_template 中
+    抽出「主题：{topic}」一行，抽不出来时保持原样
+    """
+    if 'static_prefix' in template:
+        return template['static_prefix'], template.get('dynamic_suffix_template', '主题：{topic}')
+    user_template = template['user_template']
+    static, n = _TOPIC_LINE_RE.subn('\n\n', user_template, count=1)
+    if n and '{topic}' not in static:
+        return static.strip(), '主题：{topic}'
+    return '', user_template
+
+
+_CODE_BLOCK_OPEN_RE = re.compile(r'^```(?:json)?\s*\n?')
+_CODE_BLOCK_CLOSE_RE = re.compile(r'\n?```\s*$')
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _scan_json_object(text):
+    """
+    从第一个 { 开始逐字符扫描，找到与之配对的 }（跳过字符串内的括号和转义）
+    返回对象文本，找不到返回 None
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+    depth = 0
+    in_str = False
+    esc = False
+    for j in range(start, len(text)):
+        ch = text[j]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == '\\':
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:j + 1]
+    return None
 
 
 def extract_json(text):
     """从 LLM 输出中提取 JSON（兼容 markdown code block 包裹）"""
     # 去掉 markdown code block
-    text = re.sub(r'^```(?:json)?\s*\n?', '', text.strip())
-    text = re.sub(r'\n?```\s*$', '', text.strip())
+    text = _CODE_BLOCK_OPEN_RE.sub('', text.strip())
+    text = _CODE_BLOCK_CLOSE_RE.sub('', text.strip())
 
     # 清理控制字符（保留 \n \r \t）
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', text)
+    text = _CONTROL_CHARS_RE.sub('', text)
 
     # 尝试直接解析
     try:
@@ -219,18 +686,72 @@ def extract_json(text):
     except json.JSONDecodeError:
         pass
 
-    # 尝试找第一个 { ... } 块
-    match = re.search(r'\{[\s\S]*\}', text)
-    if match:
+    # 尝试找第一个完整的 { ... } 块
+    block = _scan_json_object(text)
+    if block:
         try:
-            return json.loads(match.group())
+            return json.loads(block)
         except json.JSONDecodeError:
             pass
 
     raise ValueError(f"无法从 LLM 输出中提取 JSON:\n{text[:500]}")
 
 
-def generate_content(topic, style='default', extra_instructions=''):
+def _resolve_template(style):
+    """加载风格模板，找不到时回退默认模板"""
+    template = load_template(style)
+    if not template:
+        print(f"[内容生成] 未找到模板 '{style}'，使用默认模板", file=sys.stderr)
+        template = load_template('default')
+    if not template:
+        raise RuntimeError(f"模板加载失败: {style}")
+    return template
+
+
+@lru_cache(maxsize=32)
+def _read_examples(path_str, mtime_ns):
+    """读取 examples.jsonl 并渲染为示例文本（按 mtime 缓存），空行和坏行跳过"""
+    blocks = []
+    with open(path_str, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            blocks.append(f"示例{len(blocks) + 1}：\n{json.dumps(item, ensure_ascii=False)}")
+    return '\n\n'.join(blocks)
+
+
+def load_examples(style_id):
+    """
+    加载风格示例 templates/<style>/examples.jsonl（每行一个 JSON 示例，可选）
+    示例放在静态前缀里，跨请求不变，由服务端前缀缓存吸收
+    """
+    path = TEMPLATES_DIR / style_id / 'examples.jsonl'
+    try:
+        return _read_examples(str(path), os.stat(path).st_mtime_ns)
+    except OSError:
+        return ''
+
+
+def _build_prompts(template):
+    """返回 (system_prompt, 主题后缀模板)；静态部分（含风格示例）全部放进 system"""
+    system_prompt = template.get('system', '你是一位资深小红书内容创作者。')
+    # 通用约束
+    system_prompt += '\n\n重要约束：\n1. 正文中绝对不要出现任何代码片段、代码块或技术命令。讲方法、讲思路即可，用通俗易懂的语言解释。\n2. 不要使用任何 Markdown 格式（如 #、##、**加粗**、*斜体*、- 列表符号等）。用 emoji 和换行来组织排版，符合小红书的阅读习惯。'
+    static_instructions, suffix_template = _split_prompt(template)
+    if static_instructions:
+        system_prompt += '\n\n' + static_instructions
+    examples = load_examples(template.get('id', 'default'))
+    if examples:
+        system_prompt += '\n\n以下是该风格的参考示例（学习语气和结构，不要照抄内容）：\n\n' + examples
+    return system_prompt, suffix_template
+
+
+def generate_content(topic, style='default', extra_instructions='', cache=None):
     """
     根据主题和风格生成小红书内容
 
@@ -238,6 +759,7 @@ def generate_content(topic, style='default', extra_instructions=''):
         topic: 主题/关键词
         style: 文案风格 (default/review/tutorial/daily/listicle/story/debate/comparison)
         extra_instructions: 额外指令
+        cache: 是否使用 LLM 响应缓存（见 call_llm）；为 True 时还会复用措辞略有差别的同一主题的结果
 
     Returns:
         dict: {title, content, content_pages, tags, call_to_action, style, topic}
@@ -248,29 +770,84 @@ def generate_content(topic, style='default', extra_instructions=''):
         raise RuntimeError("未找到可用的 LLM 配置，请检查 ~/.openclaw/openclaw.json")
 
     # 加载模板
-    template = load_template(style)
-    if not template:
-        print(f"[内容生成] 未找到模板 '{style}'，使用默认模板", file=sys.stderr)
-        template = load_template('default')
-    if not template:
-        raise RuntimeError(f"模板加载失败: {style}")
-
-    system_prompt = template.get('system', '你是一位资深小红书内容创作者。')
-    # 通用约束
-    system_prompt += '\n\n重要约束：\n1. 正文中绝对不要出现任何代码片段、代码块或技术命令。讲方法、讲思路即可，用通俗易懂的语言解释。\n2. 不要使用任何 Markdown 格式（如 #、##、**加粗**、*斜体*、- 列表符号等）。用 emoji 和换行来组织排版，符合小红书的阅读习惯。'
-    user_prompt = template['user_template'].replace('{topic}', topic)
+    template = _resolve_template(style)
+    system_prompt, suffix_template = _build_prompts(template)
+    user_prompt = suffix_template.replace('{topic}', topic)
 
     if extra_instructions:
         user_prompt += f"\n\n额外要求：{extra_instructions}"
 
     print(f"[内容生成] 主题: {topic} | 风格: {template['name']} | 模型: {llm_cfg['model']}", file=sys.stderr)
 
-    # 调用 LLM
-    raw_text = call_llm(system_prompt, user_prompt, llm_cfg)
+    # 调用 LLM（显式开启缓存时，先查归一化后相同的已生成主题；否则流式生成）
+    style_id = template.get('id', style)
+    similar = _lookup_similar_topic(topic, style_id, extra_instructions, llm_cfg['model']) if cache else None
+    if similar:
+        print(f"[内容生成] 命中相近主题缓存: {similar[0]}", file=sys.stderr)
+        raw_text = similar[1]
+    elif cache:
+        raw_text = call_llm(system_prompt, user_prompt, llm_cfg, cache=cache)
+        _remember_topic(topic, style_id, extra_instructions, llm_cfg['model'], raw_text)
+    else:
+        raw_text = _collect_stream(system_prompt, user_prompt, llm_cfg)
 
     # 解析 JSON
-    result = extract_json(raw_text)
+    return _finalize_output(extract_json(raw_text), topic, style_id, llm_cfg['model'])
+
+
+def generate_content_multi(topics, style='default', extra_instructions=''):
+    """
+    一次 LLM 调用为多个主题生成内容（共享 system 与连接开销，只发一次请求）
+
+    Returns:
+        list: 与 topics 一一对应；缺失或解析失败的项为 {success: False, error, topic}
+    """
+    if not topics:
+        return []
+    if len(topics) == 1:
+        return [generate_content(topics[0], style=style, extra_instructions=extra_instructions)]
+
+    llm_cfg = get_llm_config()
+    if not llm_cfg:
+        raise RuntimeError("未找到可用的 LLM 配置，请检查 ~/.openclaw/openclaw.json")
+
+    # 主题过多时分组请求，每组篇数按模型输出上限折算（上限较小的模型退化为逐个生成）
+    budget = min(MAX_TOKENS_RETRY, llm_cfg.get('max_output_tokens', MAX_OUTPUT_DEFAULT) - llm_cfg.get('thinking_tokens', 0))
+    group = max(1, min(MULTI_TOPICS_MAX, budget // MULTI_TOPIC_TOKENS))
+    if len(topics) > group:
+        outputs = []
+        for i in range(0, len(topics), group):
+            outputs.extend(generate_content_multi(topics[i:i + group], style, extra_instructions))
+        return outputs
+
+    template = _resolve_template(style)
+    system_prompt, _ = _build_prompts(template)
+    user_prompt = (
+        '为以下每个主题分别生成一篇笔记，每篇都遵守上述要求和 JSON 结构。\n'
+        f'严格返回 JSON：{{"results": [每个主题一个对象，共 {len(topics)} 个，顺序与主题一致]}}\n\n'
+        + '\n'.join(f"{i + 1}. {t}" for i, t in enumerate(topics))
+    )
+    if extra_instructions:
+        user_prompt += f"\n\n额外要求：{extra_instructions}"
+
+    print(f"[内容生成] 合并生成 {len(topics)} 个主题 | 风格: {template['name']} | 模型: {llm_cfg['model']}", file=sys.stderr)
+    # 每篇预留 MULTI_TOPIC_TOKENS，分组时已保证不超过模型输出上限
+    raw_text = _collect_stream(system_prompt, user_prompt, llm_cfg, max_tokens=MULTI_TOPIC_TOKENS * len(topics))
+    items = extract_json(raw_text).get('results') or []
+
+    style_id = template.get('id', style)
+    outputs = []
+    for i, topic in enumerate(topics):
+        item = items[i] if i < len(items) else None
+        if not isinstance(item, dict):
+            outputs.append({'success': False, 'error': 'LLM 输出中缺少该主题的结果', 'topic': topic})
+            continue
+        outputs.append(_finalize_output(item, topic, style_id, llm_cfg['model']))
+    return outputs
 
+
+def _finalize_output(result, topic, style_id, model):
+    """把 LLM 返回的 JSON 标准化，并做标题截断、超长正文处理"""
     # 标准化输出
     output = {
         'title': result.get('title', ''),
@@ -278,10 +855,10 @@ def generate_content(topic, style='default', extra_instructions=''):
         'content_pages': result.get('content_pages', []),
         'tags': result.get('tags', result.get('hashtags', [])),
         'call_to_action': result.get('call_to_action', ''),
-        'style': template.get('id', style),
+        'style': style_id,
         'topic': topic,
         'generated_at': datetime.now().isoformat(),
-        'model': llm_cfg['model'],
+        'model': model,
     }
 
     # 清理标签格式（确保不带 #）
@@ -292,7 +869,7 @@ def generate_content(topic, style='default', extra_instructions=''):
         # 在20字内找最后一个标点或空格截断，保持语义完整
         t = output['title'][:20]
         for i in range(19, 14, -1):
-            if t[i] in '，。！？、·~…—|,!? ':
+            if t[i] in _TITLE_BREAKS:
                 t = t[:i]
                 break
         output['title'] = t
@@ -312,44 +889,63 @@ def generate_content(topic, style='default', extra_instructions=''):
         output['overflow_text'] = full_content.rstrip()
         
         # 追加 AI 声明到编辑器文本
-        if not output['content'].rstrip().endswith('AI辅助创作'):
-            output['content'] = output['content'].rstrip() + '\n\n📝 本文由 AI 辅助创作'
+        editor = output['content'].rstrip()
+        if not editor.endswith(_AI_MARKS):
+            editor += '\n\n' + _AI_DISCLAIMER
+        output['content'] = editor
             
     else:
         # 兼容旧格式：走现有的超长截断逻辑
         print(f"[内容生成] 兼容旧格式，使用超长截断逻辑", file=sys.stderr)
         
         full_content = output['content']
+        stripped = full_content.rstrip()
         MAX_EDITOR = 950  # 编辑器安全上限
 
         if len(full_content) > MAX_EDITOR:
             # 全部内容转为图片文本，编辑器只放引导语
-            overflow_text = full_content.rstrip()
-            # 去掉可能已有的声明（图片水印会体现）
-            overflow_text = overflow_text.replace('📝 本文由 AI 辅助创作', '').strip()
-
-            editor_text = '👉 完整内容见图片，左滑查看全文\n\n📝 本文由 AI 辅助创作'
-
-            output['content'] = editor_text
-            output['overflow_text'] = overflow_text
+            # 去掉末尾可能已有的声明（图片水印会体现）
+            if stripped.endswith(_AI_DISCLAIMER):
+                stripped = stripped[:-len(_AI_DISCLAIMER)]
+            output['content'] = '👉 完整内容见图片，左滑查看全文\n\n' + _AI_DISCLAIMER
+            output['overflow_text'] = stripped.strip()
             print(f"[内容生成] 正文超长({len(full_content)}字): 全部转为文字图片", file=sys.stderr)
         else:
             # 正常长度，追加 AI 声明
-            if full_content and not full_content.rstrip().endswith('AI辅助创作'):
-                output['content'] = full_content.rstrip() + '\n\n📝 本文由 AI 辅助创作'
+            if stripped and not stripped.endswith(_AI_MARKS):
+                output['content'] = stripped + '\n\n' + _AI_DISCLAIMER
             output['overflow_text'] = ''
 
     return output
 
 
+def generate_content_batch(topics, style='default', extra_instructions='', max_concurrency=6):
+    """
+    并发为多个主题生成内容（LLM 调用是 I/O 密集，线程池即可并行）
+
+    Returns:
+        list: 与 topics 一一对应；失败项为 {success: False, error, topic}
+    """
+    def _one(topic):
+        try:
+            return generate_content(topic, style=style, extra_instructions=extra_instructions)
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'topic': topic}
+
+    if not topics:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(topics))) as ex:
+        return list(ex.map(_one, topics))
+
+
 def save_content(content_data, filename=None):
     """保存生成的内容到 JSON 文件"""
     if not filename:
         ts = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"gen_{ts}.json"
     path = CONTENT_DIR / filename
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(content_data, f, ensure_ascii=False, indent=2)
+    with open(path, 'wb') as f:
+        f.write(_dumps(content_data, indent=True))
     return str(path)
 
 
@@ -357,11 +953,19 @@ def save_content(content_data, filename=None):
 
 def cmd_generate(args):
     """生成内容"""
+    topics = ([args.topic] if args.topic else []) + (args.topics or [])
+    if not topics:
+        print(json.dumps({'success': False, 'error': '请指定主题'}, ensure_ascii=False, indent=2))
+        sys.exit(1)
+    if len(topics) > 1:
+        return _cmd_generate_multi(args, topics)
+
     try:
         result = generate_content(
-            topic=args.topic,
+            topic=topics[0],
             style=args.style,
             extra_instructions=args.extra or '',
+            cache=True if args.cache else None,
         )
 
         # 保存到文件
@@ -380,6 +984,39 @@ def cmd_generate(args):
         sys.exit(1)
 
 
+def _cmd_generate_multi(args, topics):
+    """多个主题合并为一次 LLM 调用生成"""
+    try:
+        results = generate_content_multi(topics, style=args.style, extra_instructions=args.extra or '')
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}, ensure_ascii=False, indent=2))
+        sys.exit(1)
+    if args.save:
+        for r in results:
+            if r.get('success', True):
+                r['saved_to'] = save_content(r, filename=f"gen_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if any(not r.get('success', True) for r in results):
+        sys.exit(1)
+
+
+def cmd_batch(args):
+    """并发批量生成"""
+    results = generate_content_batch(
+        args.topics,
+        style=args.style,
+        extra_instructions=args.extra or '',
+        max_concurrency=args.workers,
+    )
+    if args.save:
+        for r in results:
+            if r.get('success', True):
+                r['saved_to'] = save_content(r, filename=f"gen_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if any(not r.get('success', True) for r in results):
+        sys.exit(1)
+
+
 def cmd_list_styles(args):
     """列出可用风格"""
     templates = list_templates()
@@ -395,11 +1032,23 @@ def main():
 
     # generate
     p_gen = sub.add_parser('generate', help='生成小红书内容')
-    p_gen.add_argument('topic', help='主题/关键词')
+    p_gen.add_argument('topic', nargs='?', help='主题/关键词')
+    p_gen.add_argument('--topic', '-t', dest='topics', action='append',
+                       help='主题（可重复指定多个，多个主题合并为一次 LLM 调用生成）')
     p_gen.add_argument('--style', '-s', default='default',
                        help='文案风格: default/review/tutorial/daily/listicle/story/debate/comparison')
     p_gen.add_argument('--extra', '-e', help='额外指令')
     p_gen.add_argument('--save', action='store_true', help='保存到文件')
+    p_gen.add_argument('--cache', action='store_true',
+                       help='复用 LLM 响应缓存及相近主题的已生成结果（默认每次重新生成）')
+
+    # batch
+    p_batch = sub.add_parser('batch', help='并发为多个主题生成内容')
+    p_batch.add_argument('topics', nargs='+', help='主题/关键词（可多个）')
+    p_batch.add_argument('--style', '-s', default='default', help='文案风格')
+    p_batch.add_argument('--extra', '-e', help='额外指令')
+    p_batch.add_argument('--workers', type=int, default=6, help='最大并发数（默认6）')
+    p_batch.add_argument('--save', action='store_true', help='保存到文件')
 
     # styles
     sub.add_parser('styles', help='列出可用文案风格')
@@ -408,6 +1057,8 @@ def main():
 
     if args.command == 'generate':
         cmd_generate(args)
+    elif args.command == 'batch':
+        cmd_batch(args)
     elif args.command == 'styles':
         cmd_list_styles(args)
     else:
@@ -6,13 +6,29 @@
 
 import os
 import random
+import hashlib
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageFilter
 from datetime import datetime
 
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 # 中文字体路径
 FONT_PATH = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
 
+SKILL_DIR = Path(__file__).parent.parent
+# 背景层（背景色/渐变 + 装饰）磁盘缓存目录：放在 skill 自己的目录下（与 LLM 缓存一致），
+# 不用共享可写的系统临时目录，避免其他本地用户预置/替换缓存图
+BG_CACHE_DIR = SKILL_DIR / 'content' / '.bg_cache'
+# 背景渲染逻辑变化时递增，使旧缓存失效
+BG_CACHE_VERSION = 3
+
 # 模板定义
 TEMPLATES = {
     'minimal': {
@@ -133,44 +149,93 @@ TEMPLATES = {
 }
 
 
+@lru_cache(maxsize=32)
 def load_font(size):
-    """加载中文字体"""
+    """加载中文字体（按字号缓存，避免重复解析 TTC）"""
     try:
         return ImageFont.truetype(FONT_PATH, size)
     except Exception:
         return ImageFont.load_default()
 
 
+def _hex_to_rgb(color):
+    """'#RRGGBB' → (r, g, b)"""
+    return tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+
+
+def _deco_rgb(color):
+    """装饰元素颜色：'#RRGGBB' 解析为 (r, g, b)，其他写法按白色处理"""
+    return _hex_to_rgb(color) if color.startswith('#') else (255, 255, 255)
+
+
+def _compile_templates():
+    """导入时把模板里的十六进制颜色预解析为 (r, g, b)，与原字段并存（*_rgb）"""
+    for template in TEMPLATES.values():
+        for key in ('bg_color', 'title_color', 'subtitle_color'):
+            if key in template:
+                template[key.replace('_color', '_rgb')] = ImageColor.getrgb(template[key])[:3]
+        if 'bg_gradient' in template:
+            template['bg_gradient_rgb'] = [_hex_to_rgb(c) for c in template['bg_gradient']]
+        for deco in template.get('decorations', []):
+            deco['color_rgb'] = _deco_rgb(deco['color'])
+
+
+_compile_templates()
+
+
+def _gradient_row_color(ratio, stops):
+    """在均匀分布的色标之间线性插值，ratio 取值 [0, 1)"""
+    seg = ratio * (len(stops) - 1)
+    i = min(int(seg), len(stops) - 2)
+    t = seg - i
+    c1, c2 = stops[i], stops[i + 1]
+    return tuple(int(a + (b - a) * t) for a, b in zip(c1, c2))
+
+
 def create_gradient_background(width, height, colors):
-    """创建渐变背景"""
+    """
+    创建渐变背景（从上到下的线性渐变，支持多个色标）
+    有 numpy 时整幅一次算出；否则只算一列像素，再横向拉伸到整幅宽度
+    """
     if len(colors) < 2:
         colors = colors + colors  # 重复颜色
-    
-    img = Image.new('RGB', (width, height))
-    draw = ImageDraw.Draw(img)
-    
-    # 简单的线性渐变（从上到下）
-    for y in range(height):
-        ratio = y / height
-        # 在两个颜色之间插值
-        r1, g1, b1 = tuple(int(colors[0][i:i+2], 16) for i in (1, 3, 5))
-        r2, g2, b2 = tuple(int(colors[1][i:i+2], 16) for i in (1, 3, 5))
-        
-        r = int(r1 + (r2 - r1) * ratio)
-        g = int(g1 + (g2 - g1) * ratio)
-        b = int(b1 + (b2 - b1) * ratio)
-        
-        draw.line([(0, y), (width, y)], fill=(r, g, b))
-    
-    return img
+    stops = [c if isinstance(c, tuple) else _hex_to_rgb(c) for c in colors]
+
+    if HAS_NUMPY:
+        rgb = np.array(stops, dtype=np.float32)
+        t = np.arange(height, dtype=np.float32) / height
+        pos = np.linspace(0, 1, len(stops), dtype=np.float32)
+        col = np.stack([np.interp(t, pos, rgb[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+        arr = np.broadcast_to(col[:, None, :], (height, width, 3))
+        return Image.fromarray(np.ascontiguousarray(arr), 'RGB')
+
+    column = Image.new('RGB', (1, height))
+    column.putdata([_gradient_row_color(y / height, stops) for y in range(height)])
+    return column.resize((width, height), Image.NEAREST)
+
 
+@lru_cache(maxsize=32)
+def _circle_stamp(size, rgb, alpha):
+    """圆形装饰的 RGBA 贴图（按 尺寸/颜色/透明度 缓存复用）"""
+    if HAS_NUMPY:
+        c = size / 2
+        yy, xx = np.ogrid[:size, :size]
+        mask = ((xx + 0.5 - c) ** 2 + (yy + 0.5 - c) ** 2 <= c * c).astype(np.uint8) * np.uint8(alpha)
+        rgba = np.dstack([np.full_like(mask, v) for v in rgb] + [mask])
+        return Image.fromarray(rgba, 'RGBA')
+    stamp = Image.new('RGBA', (size, size), rgb + (0,))
+    ImageDraw.Draw(stamp).ellipse([0, 0, size - 1, size - 1], fill=rgb + (alpha,))
+    return stamp
 
-def draw_decorations(draw, decorations, width, height):
-    """绘制装饰元素"""
+
+def draw_decorations(img, decorations, width, height):
+    """绘制装饰元素（img 需为 RGBA，半透明圆形按透明度叠加）"""
+    draw = ImageDraw.Draw(img)
     for deco in decorations:
         deco_type = deco['type']
         pos = deco['pos']
-        color = deco['color']
+        # 颜色（模板里已预解析为 color_rgb）
+        r, g, b = deco.get('color_rgb') or _deco_rgb(deco['color'])
         alpha = deco.get('alpha', 255)
         
         # 转换相对位置为绝对位置
@@ -183,21 +248,10 @@ def draw_decorations(draw, decorations, width, height):
         if deco_type == 'circle':
             size = deco['size']
             radius = size // 2
-            # 创建带透明度的圆形
-            circle_img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-            circle_draw = ImageDraw.Draw(circle_img)
-            
-            # 解析颜色
-            if color.startswith('#'):
-                r, g, b = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
-            else:
-                r, g, b = 255, 255, 255
-            
-            circle_draw.ellipse([0, 0, size, size], fill=(r, g, b, alpha))
-            
-            # 粘贴到主图像
-            temp_img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            temp_img.paste(circle_img, (x - radius, y - radius))
+            # 带透明度的圆形贴图叠加到主图像（超出左/上边界的部分裁掉）
+            left, top = x - radius, y - radius
+            img.alpha_composite(_circle_stamp(size, (r, g, b), alpha),
+                                (max(left, 0), max(top, 0)), (max(-left, 0), max(-top, 0)))
             
         elif deco_type == 'rect':
             size = deco['size']
@@ -207,18 +261,10 @@ def draw_decorations(draw, decorations, width, height):
             else:
                 w = h = size
             
-            # 解析颜色
-            if color.startswith('#'):
-                r, g, b = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
-            else:
-                r, g, b = 255, 255, 255
-            
             if deco.get('fill', True):
                 draw.rectangle([x, y, x + w, y + h], fill=(r, g, b))
             else:
-                width_px = deco.get('width', 1)
-                for i in range(width_px):
-                    draw.rectangle([x + i, y + i, x + w - i, y + h - i], outline=(r, g, b))
+                draw.rectangle([x, y, x + w, y + h], outline=(r, g, b), width=deco.get('width', 1))
         
         elif deco_type == 'line':
             size = deco['size']
@@ -228,37 +274,149 @@ def draw_decorations(draw, decorations, width, height):
             else:
                 w, h = size, 1
             
-            # 解析颜色
-            if color.startswith('#'):
-                r, g, b = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
-            else:
-                r, g, b = 255, 255, 255
-            
             draw.rectangle([x, y, x + w, y + h], fill=(r, g, b))
 
 
+def _render_background(template, width, height):
+    """渲染模板的背景层：背景色/渐变 + 装饰元素"""
+    if 'bg_gradient' in template:
+        img = create_gradient_background(width, height, template.get('bg_gradient_rgb') or template['bg_gradient'])
+    else:
+        img = Image.new('RGB', (width, height), template.get('bg_rgb', (255, 255, 255)))
+
+    # 绘制装饰元素
+    if 'decorations' in template:
+        img = img.convert('RGBA')
+        draw_decorations(img, template['decorations'], width, height)
+        img = img.convert('RGB')
+    return img
+
+
+def _bg_cache_path(template_name, width, height):
+    """背景缓存文件路径；文件名带模板定义和渲染版本的哈希，改了模板自动失效"""
+    key = f'{BG_CACHE_VERSION}:{TEMPLATES[template_name]!r}'
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4).hexdigest()
+    return BG_CACHE_DIR / f'{template_name}_{width}x{height}_{digest}.png'
+
+
+@lru_cache(maxsize=16)
+def _load_background(template_name, width, height):
+    """
+    获取模板背景层（进程内 + 磁盘两级缓存）
+    返回共享对象，调用方需 .copy() 后再绘制
+    """
+    path = _bg_cache_path(template_name, width, height)
+    try:
+        with Image.open(path) as cached:
+            return cached.convert('RGB')
+    except (OSError, ValueError):
+        pass
+
+    img = _render_background(TEMPLATES[template_name], width, height)
+    try:
+        BG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=BG_CACHE_DIR, suffix='.tmp', delete=False) as f:
+            img.save(f, format='PNG', optimize=True)
+        os.replace(f.name, path)
+    except OSError:
+        pass  # 缓存写失败不影响出图
+    return img
+
+
+@lru_cache(maxsize=1024)
+def _text_width(font, text, char_width=20):
+    """测量文本宽度（按 字体/文本 缓存）；字体不支持 getbbox 时按每字 char_width 估算"""
+    if hasattr(font, 'getbbox'):
+        bbox = font.getbbox(text)
+        return bbox[2] - bbox[0]
+    return len(text) * char_width
+
+
+def _space_width(font):
+    """空格的前进宽度（空白字符的 bbox 可能为空，优先用 getlength）"""
+    if hasattr(font, 'getlength'):
+        return font.getlength(' ')
+    return _text_width(font, ' ')
+
+
 def wrap_text(text, font, max_width):
-    """文本自动换行"""
+    """文本自动换行（每个词只测量一次，行宽累加）"""
     lines = []
-    words = text.split()
-    current_line = ""
+    space_w = _space_width(font)
+    current = []
+    current_w = 0
     
-    for word in words:
-        test_line = current_line + (" " if current_line else "") + word
-        bbox = font.getbbox(test_line) if hasattr(font, 'getbbox') else (0, 0, len(test_line) * 20, 20)
-        if bbox[2] - bbox[0] <= max_width:
-            current_line = test_line
+    for word in text.split():
+        word_w = _text_width(font, word)
+        test_w = current_w + space_w + word_w if current else word_w
+        if test_w <= max_width:
+            current.append(word)
+            current_w = test_w
         else:
-            if current_line:
-                lines.append(current_line)
-            current_line = word
+            if current:
+                lines.append(' '.join(current))
+            current = [word]
+            current_w = word_w
     
-    if current_line:
-        lines.append(current_line)
+    if current:
+        lines.append(' '.join(current))
     
     return lines
 
 
+@lru_cache(maxsize=64)
+def _render_text_layer(template_name, title, subtitle, width, height):
+    """
+    渲染标题/副标题文字层，按 (模板, 标题, 副标题, 尺寸) 缓存
+    返回 ((颜色, 灰度遮罩, 左上角), ...)：遮罩按内容裁剪，贴图时按遮罩与底图混合，
+    用 L 遮罩而不是 RGBA 图层，抗锯齿边缘不会混入透明底色
+    """
+    template = TEMPLATES[template_name]
+    layers = []
+
+    def _add_layer(lines, font, color, x0, y0, line_height, char_width):
+        mask = Image.new('L', (width, height), 0)
+        draw = ImageDraw.Draw(mask)
+        for i, line in enumerate(lines):
+            line_width = _text_width(font, line, char_width)
+            draw.text((x0 - line_width // 2, y0 + i * line_height), line, fill=255, font=font)
+        bbox = mask.getbbox()
+        if bbox:
+            layers.append((color, mask.crop(bbox), bbox[:2]))
+
+    # 标题（按总高度垂直居中）
+    title_font = load_font(template['title_size'])
+    title_lines = wrap_text(title, title_font, width * 0.8)
+    title_pos = template['title_pos']
+    title_y = int(title_pos[1] * height)
+    total_title_height = len(title_lines) * template['title_size'] * 1.2
+    _add_layer(title_lines, title_font, template['title_rgb'],
+               int(title_pos[0] * width), title_y - total_title_height // 2,
+               template['title_size'] * 1.2, 20)
+
+    # 副标题
+    if subtitle:
+        subtitle_font = load_font(template['subtitle_size'])
+        subtitle_lines = wrap_text(subtitle, subtitle_font, width * 0.8)
+        subtitle_pos = template['subtitle_pos']
+        _add_layer(subtitle_lines, subtitle_font, template['subtitle_rgb'],
+                   int(subtitle_pos[0] * width), int(subtitle_pos[1] * height),
+                   template['subtitle_size'] * 1.2, 15)
+
+    return tuple(layers)
+
+
+def save_image(img, path):
+    """按扩展名选择编码参数保存：JPEG 渐进式压缩，PNG 用快速压缩档"""
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in ('.jpg', '.jpeg'):
+        img.save(path, 'JPEG', quality=90, optimize=True, progressive=True)
+    elif ext == '.png':
+        img.save(path, 'PNG', compress_level=1)
+    else:
+        img.save(path)
+
+
 def generate_cover(title, subtitle="", template_name="minimal", output_path=None):
     """
     生成封面图
@@ -290,63 +448,19 @@ def generate_cover(title, subtitle="", template_name="minimal", output_path=None
     width, height = 1080, 1440
     
     try:
-        # 创建背景
-        if 'bg_gradient' in template:
-            img = create_gradient_background(width, height, template['bg_gradient'])
-        else:
-            bg_color = template.get('bg_color', '#FFFFFF')
-            img = Image.new('RGB', (width, height), bg_color)
-        
-        draw = ImageDraw.Draw(img)
-        
-        # 绘制装饰元素
-        if 'decorations' in template:
-            draw_decorations(draw, template['decorations'], width, height)
-        
-        # 加载字体
-        title_font = load_font(template['title_size'])
-        subtitle_font = load_font(template['subtitle_size'])
-        
-        # 绘制标题
-        title_lines = wrap_text(title, title_font, width * 0.8)
-        title_pos = template['title_pos']
-        title_x = int(title_pos[0] * width)
-        title_y = int(title_pos[1] * height)
-        
-        # 计算总标题高度用于居中
-        total_title_height = len(title_lines) * template['title_size'] * 1.2
-        start_y = title_y - total_title_height // 2
-        
-        for i, line in enumerate(title_lines):
-            bbox = title_font.getbbox(line) if hasattr(title_font, 'getbbox') else (0, 0, len(line) * 20, 20)
-            line_width = bbox[2] - bbox[0]
-            line_x = title_x - line_width // 2
-            line_y = start_y + i * template['title_size'] * 1.2
-            
-            draw.text((line_x, line_y), line, fill=template['title_color'], font=title_font)
-        
-        # 绘制副标题
-        if subtitle:
-            subtitle_lines = wrap_text(subtitle, subtitle_font, width * 0.8)
-            subtitle_pos = template['subtitle_pos']
-            subtitle_x = int(subtitle_pos[0] * width)
-            subtitle_y = int(subtitle_pos[1] * height)
-            
-            for i, line in enumerate(subtitle_lines):
-                bbox = subtitle_font.getbbox(line) if hasattr(subtitle_font, 'getbbox') else (0, 0, len(line) * 15, 15)
-                line_width = bbox[2] - bbox[0]
-                line_x = subtitle_x - line_width // 2
-                line_y = subtitle_y + i * template['subtitle_size'] * 1.2
-                
-                draw.text((line_x, line_y), line, fill=template['subtitle_color'], font=subtitle_font)
+        # 背景层（按模板缓存），复制一份再贴文字层
+        img = _load_background(template_name, width, height).copy()
+        for color, mask, (x, y) in _render_text_layer(template_name, title, subtitle, width, height):
+            img.paste(color, (x, y, x + mask.width, y + mask.height), mask)
         
-        # 生成输出路径
+        # 生成输出路径（渐变背景用 JPEG，纯色背景 PNG 压缩率更好）
         if not output_path:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f'/tmp/cover_{template_name}_{timestamp}.png'
+            ext = 'jpg' if 'bg_gradient' in template else 'png'
+            output_path = f'/tmp/cover_{template_name}_{timestamp}.{ext}'
         
         # 保存图片
-        img.save(output_path, quality=95)
+        save_image(img, output_path)
         
         return {
             'success': True,
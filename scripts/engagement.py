@@ -4,7 +4,11 @@
 从小红书创作者中心抓取笔记的阅读、点赞、收藏、评论等互动数据
 """
 
+import os
 import json
+import re
+import tempfile
+from collections import deque
 import time
 import logging
 import sys
@@ -18,24 +22,129 @@ DATA_DIR = SKILL_DIR / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 
 ENGAGEMENT_DB = DATA_DIR / 'engagement.json'
+# 快照追加写入 JSONL，读取时只取最近 MAX_SNAPSHOTS 条，文件过大时再压缩
+SNAPSHOTS_FILE = DATA_DIR / 'snapshots.jsonl'
+MAX_SNAPSHOTS = 60
+SNAPSHOTS_COMPACT_BYTES = 1024 * 1024
 XHS_CONTENT_MANAGE = 'https://creator.xiaohongshu.com/publish/manage'
 
+# 数字解析（支持 1.2万 / 1.2w）
+_NUM_WAN_RE = re.compile(r'^([\d.]+)\s*[万w]')
+_NUM_RE = re.compile(r'^[\d.]+')
+_RAW_NUMS_RE = re.compile(r'([\d.]+[万w]?)')
+
+# 状态关键词（按优先级）
+_STATUS_KEYWORDS = ('审核中', '未通过', '已隐藏', '草稿', '已发布', '公开')
+_STATUS_RE = re.compile('|'.join(_STATUS_KEYWORDS))
+
+# 笔记列表行（多种改版的选择器），匹配不到时退回表格行
+_ROW_SEL = (
+    '.note-item, [class*="note-item"], [class*="NoteItem"], '
+    'table tbody tr, .content-item, [class*="content-item"], '
+    '[class*="ManageNote"], .manage-note-item'
+)
+_ROW_FALLBACK_SEL = '.ant-table-row, [class*="table"] tr'
+_TITLE_SELS = ['[class*="title"]', '.note-title', 'a', '[class*="name"]']
+# 各数据列按 class / title 属性里的关键词匹配
+_FIELD_KEYWORDS = [
+    ('views', ['阅读', '观看', '浏览', 'view', 'read', '曝光']),
+    ('likes', ['点赞', '赞', 'like', '❤']),
+    ('collects', ['收藏', 'collect', 'star', '⭐']),
+    ('comments', ['评论', 'comment', '💬']),
+    ('shares', ['分享', 'share', '转发']),
+]
+
+# 在页面内一次性提取所有行：{title, text, fields: {字段: 文本}}
+_EXTRACT_ROWS_JS = """({rowSel, fallbackSel, titleSels, fieldKeywords}) => {
+    let rows = Array.from(document.querySelectorAll(rowSel));
+    if (!rows.length) rows = Array.from(document.querySelectorAll(fallbackSel));
+    return rows.map(r => {
+        let title = '';
+        for (const sel of titleSels) {
+            const el = r.querySelector(sel);
+            const t = el ? (el.innerText || '').trim() : '';
+            if (t.length > 2) { title = t; break; }
+        }
+        const fields = {};
+        for (const [field, kws] of fieldKeywords) {
+            for (const kw of kws) {
+                const el = r.querySelector(`[class*="${kw}"], [title*="${kw}"]`);
+                if (el) { fields[field] = (el.innerText || '').trim(); break; }
+            }
+        }
+        return {title, text: r.innerText || '', fields};
+    });
+}"""
+
 
 def _load_engagement_db():
-    """加载互动数据库"""
+    """加载互动数据库（只含每篇笔记的最新数据 {"notes": {标题: 数据}}）"""
     if ENGAGEMENT_DB.exists():
         try:
             with open(ENGAGEMENT_DB, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                db = json.load(f)
         except (json.JSONDecodeError, IOError):
-            pass
-    return {"notes": {}, "snapshots": []}
+            db = None
+        if db is not None:
+            if 'snapshots' in db:
+                # 旧格式：快照内嵌在 engagement.json，迁移到 snapshots.jsonl
+                if not SNAPSHOTS_FILE.exists():
+                    _write_snapshots(db['snapshots'][-MAX_SNAPSHOTS:])
+                del db['snapshots']
+                _save_engagement_db(db)
+            db.setdefault('notes', {})
+            return db
+    return {"notes": {}}
 
 
 def _save_engagement_db(db):
-    """保存互动数据库"""
-    with open(ENGAGEMENT_DB, 'w', encoding='utf-8') as f:
-        json.dump(db, f, ensure_ascii=False, indent=2)
+    """保存互动数据库（紧凑格式，临时文件 + os.replace 原子替换；查看用 cached 命令）"""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        json.dump(db, f, ensure_ascii=False, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, ENGAGEMENT_DB)
+
+
+def _write_snapshots(snapshots):
+    """整体重写快照文件（临时文件 + os.replace）"""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+        for snap in snapshots:
+            f.write(json.dumps(snap, ensure_ascii=False, separators=(',', ':')) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, SNAPSHOTS_FILE)
+
+
+def _load_snapshots(limit=MAX_SNAPSHOTS):
+    """读取最近 limit 个快照（旧 → 新），坏行跳过"""
+    try:
+        with open(SNAPSHOTS_FILE, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for line in lines:
+        try:
+            snapshots.append(json.loads(line))
+        except ValueError:
+            continue
+    return snapshots
+
+
+def _latest_snapshot():
+    """最近一次快照，没有则返回 None"""
+    _load_engagement_db()  # 确保旧格式数据已迁移
+    snapshots = _load_snapshots(limit=1)
+    return snapshots[-1] if snapshots else None
+
+
+def _append_snapshot(snapshot):
+    """追加一个快照；文件超过 SNAPSHOTS_COMPACT_BYTES 时压缩为最近 MAX_SNAPSHOTS 条"""
+    with open(SNAPSHOTS_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')) + '\n')
+    if SNAPSHOTS_FILE.stat().st_size > SNAPSHOTS_COMPACT_BYTES:
+        _write_snapshots(_load_snapshots())
 
 
 def fetch_note_engagement(page, limit=20):
@@ -45,64 +154,42 @@ def fetch_note_engagement(page, limit=20):
     """
     log.info(f'正在抓取笔记互动数据（最多 {limit} 条）...')
     page.goto(XHS_CONTENT_MANAGE, wait_until='domcontentloaded', timeout=15000)
-    time.sleep(3)
+    # 等列表行出现即可开始提取，不再固定等待 3 秒
+    try:
+        page.wait_for_selector(f'{_ROW_SEL}, {_ROW_FALLBACK_SEL}', timeout=10000)
+        time.sleep(0.5)
+    except Exception:
+        log.debug('未等到笔记列表行，继续尝试提取')
 
     notes = []
     seen_titles = set()
 
     max_scrolls = min(limit // 5 + 2, 15)
     for scroll_i in range(max_scrolls):
-        # 尝试多种选择器匹配笔记列表项
-        rows = page.locator(
-            '.note-item, [class*="note-item"], [class*="NoteItem"], '
-            'table tbody tr, .content-item, [class*="content-item"], '
-            '[class*="ManageNote"], .manage-note-item'
-        ).all()
-
-        if not rows:
-            # 备用：尝试表格行
-            rows = page.locator('.ant-table-row, [class*="table"] tr').all()
+        # 一次 evaluate 取回所有行的标题、全文和各列文本，避免逐行逐字段的 locator 往返
+        rows = page.evaluate(_EXTRACT_ROWS_JS, {
+            'rowSel': _ROW_SEL,
+            'fallbackSel': _ROW_FALLBACK_SEL,
+            'titleSels': _TITLE_SELS,
+            'fieldKeywords': _FIELD_KEYWORDS,
+        })
 
         for row in rows:
             try:
                 # 提取标题
-                title = ''
-                for sel in ['[class*="title"]', '.note-title', 'a', '[class*="name"]']:
-                    try:
-                        el = row.locator(sel).first
-                        t = el.inner_text(timeout=1000).strip()
-                        if t and len(t) > 2:
-                            title = t[:50]
-                            break
-                    except Exception:
-                        continue
+                title = row['title'][:50]
 
                 if not title or title in seen_titles:
                     continue
                 seen_titles.add(title)
 
-                # 提取数值数据 — 尝试从行内所有数字元素中提取
-                numbers = []
-                try:
-                    # 获取行内所有文本，提取数字
-                    row_text = row.inner_text(timeout=2000)
-                    import re
-                    # 匹配数字（包括带万/w的）
-                    raw_nums = re.findall(r'([\d.]+[万w]?)', row_text)
-                    for n in raw_nums:
-                        numbers.append(_parse_number(n))
-                except Exception:
-                    pass
-
-                # 提取状态
-                status = '已发布'
-                try:
-                    for kw in ['审核中', '未通过', '已隐藏', '草稿', '已发布', '公开']:
-                        if kw in row_text:
-                            status = kw
-                            break
-                except Exception:
-                    pass
+                # 提取数值数据 — 从行内全部文本中提取数字（包括带万/w的）
+                row_text = row['text']
+                numbers = [_parse_number(n) for n in _RAW_NUMS_RE.findall(row_text)]
+
+                # 提取状态（一次扫描找出所有状态词，按优先级取第一个）
+                found = set(_STATUS_RE.findall(row_text))
+                status = next((kw for kw in _STATUS_KEYWORDS if kw in found), '已发布')
 
                 # 尝试从特定 class 提取各项数据
                 data = {
@@ -115,22 +202,9 @@ def fetch_note_engagement(page, limit=20):
                     "shares": 0,
                 }
 
-                # 尝试按列名匹配
-                for field, keywords in [
-                    ('views', ['阅读', '观看', '浏览', 'view', 'read', '曝光']),
-                    ('likes', ['点赞', '赞', 'like', '❤']),
-                    ('collects', ['收藏', 'collect', 'star', '⭐']),
-                    ('comments', ['评论', 'comment', '💬']),
-                    ('shares', ['分享', 'share', '转发']),
-                ]:
-                    for kw in keywords:
-                        try:
-                            el = row.locator(f'[class*="{kw}"], [title*="{kw}"]').first
-                            val = el.inner_text(timeout=500).strip()
-                            data[field] = _parse_number(val)
-                            break
-                        except Exception:
-                            continue
+                # 按列名匹配到的文本
+                for field, val in row['fields'].items():
+                    data[field] = _parse_number(val)
 
                 # 如果特定匹配没拿到数据，用位置推断
                 # 创作者中心通常列顺序：标题 | 状态 | 阅读 | 点赞 | 收藏 | 评论 | 分享
@@ -155,17 +229,13 @@ def fetch_note_engagement(page, limit=20):
 
     log.info(f'共抓取到 {len(notes)} 条笔记数据')
 
-    # 保存快照
+    # 保存快照（追加写入）
     db = _load_engagement_db()
-    snapshot = {
+    _append_snapshot({
         "time": datetime.now().isoformat(),
         "count": len(notes),
         "notes": notes,
-    }
-    db['snapshots'].append(snapshot)
-    # 只保留最近 60 个快照
-    if len(db['snapshots']) > 60:
-        db['snapshots'] = db['snapshots'][-60:]
+    })
 
     # 更新每篇笔记的最新数据
     for note in notes:
@@ -183,11 +253,10 @@ def _parse_number(text):
     if not text:
         return 0
     text = text.strip()
-    import re
-    m = re.match(r'^([\d.]+)\s*[万w]', text)
+    m = _NUM_WAN_RE.match(text)
     if m:
         return int(float(m.group(1)) * 10000)
-    m = re.match(r'^[\d.]+', text)
+    m = _NUM_RE.match(text)
     if m:
         try:
             return int(float(m.group()))
@@ -196,6 +265,38 @@ def _parse_number(text):
     return 0
 
 
+def _aggregate(notes):
+    """一次遍历汇总各项互动数据，并找出表现最好的笔记（点赞 + 收藏最高）"""
+    views = likes = collects = comments = shares = 0
+    best_note, best_score = None, -1
+    for n in notes:
+        n_likes = n.get('likes', 0)
+        n_collects = n.get('collects', 0)
+        views += n.get('views', 0)
+        likes += n_likes
+        collects += n_collects
+        comments += n.get('comments', 0)
+        shares += n.get('shares', 0)
+        score = n_likes + n_collects
+        if score > best_score:
+            best_note, best_score = n, score
+
+    return {
+        "notes_count": len(notes),
+        "total_views": views,
+        "total_likes": likes,
+        "total_collects": collects,
+        "total_comments": comments,
+        "total_shares": shares,
+        "best_note": {
+            "title": best_note['title'],
+            "likes": best_note.get('likes', 0),
+            "collects": best_note.get('collects', 0),
+            "comments": best_note.get('comments', 0),
+        } if best_note else None,
+    }
+
+
 def generate_daily_report(include_engagement=True, page=None):
     """
     生成每日数据报告
@@ -231,56 +332,16 @@ def generate_daily_report(include_engagement=True, page=None):
     # 互动数据
     if include_engagement and page:
         notes = fetch_note_engagement(page, limit=20)
-        total_views = sum(n.get('views', 0) for n in notes)
-        total_likes = sum(n.get('likes', 0) for n in notes)
-        total_collects = sum(n.get('collects', 0) for n in notes)
-        total_comments = sum(n.get('comments', 0) for n in notes)
-        total_shares = sum(n.get('shares', 0) for n in notes)
-
-        # 找出表现最好的笔记
-        best_note = max(notes, key=lambda n: n.get('likes', 0) + n.get('collects', 0), default=None)
-
         report['engagement'] = {
-            "notes_count": len(notes),
-            "total_views": total_views,
-            "total_likes": total_likes,
-            "total_collects": total_collects,
-            "total_comments": total_comments,
-            "total_shares": total_shares,
-            "best_note": {
-                "title": best_note['title'],
-                "likes": best_note.get('likes', 0),
-                "collects": best_note.get('collects', 0),
-                "comments": best_note.get('comments', 0),
-            } if best_note else None,
+            **_aggregate(notes),
             "notes_detail": notes[:10],
         }
     elif include_engagement:
         # 从缓存读取
-        db = _load_engagement_db()
-        if db.get('snapshots'):
-            latest = db['snapshots'][-1]
-            notes = latest.get('notes', [])
-            total_views = sum(n.get('views', 0) for n in notes)
-            total_likes = sum(n.get('likes', 0) for n in notes)
-            total_collects = sum(n.get('collects', 0) for n in notes)
-            total_comments = sum(n.get('comments', 0) for n in notes)
-            total_shares = sum(n.get('shares', 0) for n in notes)
-            best_note = max(notes, key=lambda n: n.get('likes', 0) + n.get('collects', 0), default=None)
-
+        latest = _latest_snapshot()
+        if latest:
             report['engagement'] = {
-                "notes_count": len(notes),
-                "total_views": total_views,
-                "total_likes": total_likes,
-                "total_collects": total_collects,
-                "total_comments": total_comments,
-                "total_shares": total_shares,
-                "best_note": {
-                    "title": best_note['title'],
-                    "likes": best_note.get('likes', 0),
-                    "collects": best_note.get('collects', 0),
-                    "comments": best_note.get('comments', 0),
-                } if best_note else None,
+                **_aggregate(latest.get('notes', [])),
                 "cached": True,
                 "snapshot_time": latest.get('time', ''),
             }
@@ -352,9 +413,8 @@ def main():
     args = parser.parse_args()
 
     if args.action == 'cached':
-        db = _load_engagement_db()
-        if db.get('snapshots'):
-            latest = db['snapshots'][-1]
+        latest = _latest_snapshot()
+        if latest:
             print(json.dumps(latest, ensure_ascii=False, indent=2))
         else:
             print(json.dumps({"message": "暂无缓存数据"}, ensure_ascii=False))
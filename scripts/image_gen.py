@@ -5,10 +5,19 @@
 """
 
 import os
+import re
 import sys
 import json
+import shutil
+import socket
 import subprocess
 import time
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
@@ -18,14 +27,41 @@ NANO_BANANA_SCRIPT = '/home/admin/.npm/_cacache/tmp/git-clonerhDFuv/node_modules
 QWEN_IMAGE_SCRIPT = '/home/admin/.openclaw/skills/qwen-image/scripts/generate_image.py'
 OPENCLAW_CONFIG = Path.home() / '.openclaw' / 'openclaw.json'
 
+# 字体候选路径（按优先级）
+FONT_PATHS = (
+    '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+BOLD_FONT_PATHS = (
+    '/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc',
+)
+
+# 小标题判定：序号首字符 / 【】开头
+_HEADING_CHARS = frozenset('①②③④⑤⑥⑦⑧⑨⑩一二三四五六七八九十')
+_BRACKET_RE = re.compile(r'^【[^】]{0,18}】')
+
+
+# 进程内配置缓存：openclaw.json 的 mtime 未变时直接复用解析结果
+_CFG_CACHE = {'mtime': None, 'data': {}}
+
 
 def _load_config():
-    """加载 openclaw 配置"""
+    """加载 openclaw 配置（按 mtime 缓存，返回共享对象，调用方不要修改）"""
     try:
-        with open(OPENCLAW_CONFIG, 'r') as f:
-            return json.load(f)
-    except Exception:
+        mtime = os.stat(OPENCLAW_CONFIG).st_mtime_ns
+    except OSError:
         return {}
+    if _CFG_CACHE['mtime'] != mtime:
+        try:
+            with open(OPENCLAW_CONFIG, 'r') as f:
+                _CFG_CACHE['data'] = json.load(f)
+        except Exception:
+            _CFG_CACHE['data'] = {}
+        _CFG_CACHE['mtime'] = mtime
+    return _CFG_CACHE['data']
 
 
 def _get_gemini_key():
@@ -64,11 +100,63 @@ def _get_qwen_key():
     return key
 
 
+@lru_cache(maxsize=2)
+def _font_paths(bold=False):
+    """存在的候选字体文件路径（按优先级，只查一次文件系统）"""
+    return tuple(fp for fp in (BOLD_FONT_PATHS if bold else FONT_PATHS) if os.path.exists(fp))
+
+
+@lru_cache(maxsize=32)
+def _load_font(size, bold=False):
+    """
+    按字号加载字体（结果缓存，字体对象可跨图片复用）
+    bold 时只找粗体；某个字体文件加载失败时依次尝试下一个候选（如 Noto 损坏时用文泉驿），
+    全部失败返回 None，由调用方决定回退
+    """
+    for fp in _font_paths(bold):
+        try:
+            return ImageFont.truetype(fp, size)
+        except Exception:
+            continue
+    return None
+
+
+# 上游（Google）连通性检测结果缓存，避免每张图都走一遍 HTTPS 探测
+PROXY_CHECK_TTL = 300
+_PROXY_CHECK = {'ts': None, 'ok': False}
+
+
 def _test_proxy():
-    """测试代理是否能连通 Google"""
+    """
+    测试代理是否能连通 Google
+    先 TCP 连一下代理端口（代理进程没起是最常见的情况，1 秒内即可判定），
+    通了再看上游 HTTPS 探测结果（缓存 PROXY_CHECK_TTL 秒）
+    """
+    if not _proxy_port_open():
+        _PROXY_CHECK['ts'] = None
+        return False
+    now = time.monotonic()
+    if _PROXY_CHECK['ts'] is not None and now - _PROXY_CHECK['ts'] < PROXY_CHECK_TTL:
+        return _PROXY_CHECK['ok']
+    ok = _probe_proxy()
+    _PROXY_CHECK['ts'] = time.monotonic()
+    _PROXY_CHECK['ok'] = ok
+    return ok
+
+
+def _proxy_port_open(timeout=1):
+    """代理端口能否建立 TCP 连接"""
+    p = urllib.parse.urlsplit(PROXY)
+    try:
+        with socket.create_connection((p.hostname, p.port or 80), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _probe_proxy():
+    """经代理对 Google 做一次 HTTPS HEAD 探测"""
     try:
-        import urllib.request
-        import urllib.error
         proxy_handler = urllib.request.ProxyHandler({
             'https': PROXY,
             'http': PROXY
@@ -87,33 +175,78 @@ def _test_proxy():
         return False
 
 
+def _download(url, output_path, timeout=60, max_redirects=3):
+    """
+    复用长连接下载文件（同一 OSS 域名的多张图只握手一次），边读边写入磁盘
+    代理沿用环境变量设置（与 urlretrieve 行为一致）
+    """
+    # 线程级长连接池与 content_gen 的 LLM 请求共用同一实现
+    scripts_dir = str(Path(__file__).parent)
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    from content_gen import _get_conn, _drop_conn
+
+    for _ in range(max_redirects + 1):
+        u = urllib.parse.urlsplit(url)
+        scheme = u.scheme
+        port = u.port or (443 if scheme == 'https' else 80)
+        proxy = urllib.request.getproxies().get(scheme, '')
+        if proxy and urllib.request.proxy_bypass(u.hostname):
+            proxy = ''
+        path = url if (proxy and scheme == 'http') else (u.path or '/') + (f'?{u.query}' if u.query else '')
+
+        for attempt in range(2):
+            conn, key = _get_conn(scheme, u.hostname, port, proxy, timeout)
+            try:
+                conn.request('GET', path)
+                resp = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # 服务端关闭了空闲连接，换新连接重试一次
+                _drop_conn(key)
+                if attempt:
+                    raise
+            except Exception:
+                _drop_conn(key)
+                raise
+
+        try:
+            location = resp.getheader('Location')
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                resp.read()
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if resp.status != 200:
+                resp.read()
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            # 1 MiB 分块直写磁盘（无缓冲层，少一次拷贝）
+            with open(output_path, 'wb', buffering=0) as f:
+                shutil.copyfileobj(resp, f, 1024 * 1024)
+            return
+        except urllib.error.HTTPError:
+            raise
+        except Exception:
+            # 正文没读完的连接不能复用
+            _drop_conn(key)
+            raise
+    raise urllib.error.URLError(f'重定向次数过多: {url}')
+
+
 def _add_ai_watermark(image_path):
     """给图片右下角添加 'AI生成' 水印（合规要求：高度 ≥ 最短边 5%）"""
     try:
         img = Image.open(image_path)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
         w, h = img.size
         min_side = min(w, h)
         font_size = max(int(min_side * 0.05), 16)
 
-        draw = ImageDraw.Draw(img)
+        # RGBA 绘制模式：半透明填充直接混合到原图，不需要整幅 overlay + alpha_composite
+        draw = ImageDraw.Draw(img, 'RGBA')
 
         # 尝试加载中文字体
-        font = None
-        font_paths = [
-            '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-        ]
-        for fp in font_paths:
-            if os.path.exists(fp):
-                try:
-                    font = ImageFont.truetype(fp, font_size)
-                    break
-                except Exception:
-                    continue
-        if not font:
-            font = ImageFont.load_default()
+        font = _load_font(font_size) or ImageFont.load_default()
 
         text = 'AI生成'
         bbox = draw.textbbox((0, 0), text, font=font)
@@ -126,18 +259,11 @@ def _add_ai_watermark(image_path):
 
         # 半透明背景
         bg_padding = 4
-        overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
-        overlay_draw.rectangle(
+        draw.rectangle(
             [x - bg_padding, y - bg_padding, x + tw + bg_padding, y + th + bg_padding],
             fill=(0, 0, 0, 128)
         )
-        overlay_draw.text((x, y), text, fill=(255, 255, 255, 220), font=font)
-
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        img = Image.alpha_composite(img, overlay)
-        img = img.convert('RGB')
+        draw.text((x, y), text, fill=(255, 255, 255, 220), font=font)
         img.save(image_path)
         print(f'[图片生成] 已添加 AI 水印: {image_path}', file=sys.stderr)
     except Exception as e:
@@ -194,6 +320,37 @@ def generate_image(prompt, output_path, resolution='1K', cover_template=None, ti
     return _generate_template_cover(title or prompt, output_path, 'random')
 
 
+# 批量生成时的并发数（受图片 API 速率限制，不宜过大）
+IMAGE_BATCH_WORKERS = 3
+
+
+def generate_images_batch(jobs, resolution='1K', workers=IMAGE_BATCH_WORKERS):
+    """
+    并发生成多张图片（生成过程基本都在等待远端 API，线程并发即可重叠等待）
+
+    Args:
+        jobs: [{'prompt', 'output_path', 'cover_template'?, 'title'?}]
+        resolution: 分辨率 1K/2K/4K
+        workers: 最大并发数
+
+    Returns:
+        list[dict]: 与 jobs 顺序一致的 generate_image 结果
+    """
+    def run(job):
+        try:
+            return generate_image(
+                job['prompt'], job['output_path'], resolution,
+                cover_template=job.get('cover_template'), title=job.get('title'),
+            )
+        except Exception as e:
+            return {'success': False, 'path': '', 'engine': '', 'error': str(e)}
+
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        return list(pool.map(run, jobs))
+
+
 def _generate_template_cover(title, output_path, template_name='random'):
     """使用封面模板生成图片"""
     try:
@@ -224,10 +381,7 @@ def _generate_template_cover(title, output_path, template_name='random'):
 
 def _run_nano_banana(prompt, output_path, resolution, api_key):
     """调用 nano-banana-pro 生成图片"""
-    env = os.environ.copy()
-    env['HTTPS_PROXY'] = PROXY
-    env['HTTP_PROXY'] = PROXY
-    env['GEMINI_API_KEY'] = api_key
+    env = {**os.environ, 'HTTPS_PROXY': PROXY, 'HTTP_PROXY': PROXY, 'GEMINI_API_KEY': api_key}
 
     cmd = [
         'uv', 'run', NANO_BANANA_SCRIPT,
@@ -307,8 +461,7 @@ def _run_qwen_image(prompt, output_path, api_key):
             }
 
         # 下载图片
-        import urllib.request
-        urllib.request.urlretrieve(media_url, output_path)
+        _download(media_url, output_path)
 
         if Path(output_path).exists():
             return {
@@ -373,170 +526,50 @@ def render_text_pages(text, output_dir, prefix='text_page',
     output_dir.mkdir(parents=True, exist_ok=True)
 
     # 加载字体
-    font = None
-    font_paths = [
-        '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
-        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-        '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
-        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-    ]
-    for fp in font_paths:
-        if os.path.exists(fp):
-            try:
-                font = ImageFont.truetype(fp, font_size)
-                break
-            except Exception:
-                continue
-    if not font:
-        font = ImageFont.load_default()
+    font = _load_font(font_size) or ImageFont.load_default()
 
     # 加载粗体字体（用于小标题）
-    bold_font = None
-    bold_paths = [
-        '/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc',
-        '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc',
-    ]
-    for fp in bold_paths:
-        if os.path.exists(fp):
-            try:
-                bold_font = ImageFont.truetype(fp, font_size + 2)
-                break
-            except Exception:
-                continue
-    if not bold_font:
-        bold_font = font
+    bold_font = _load_font(font_size + 2, bold=True) or font
 
     pad_top, pad_right, pad_bottom, pad_left = padding
     content_width = width - pad_left - pad_right
     content_height = height - pad_top - pad_bottom
     line_height = int(font_size * line_spacing)
 
-    # 清理 Markdown 格式符号
-    import re
-    def strip_markdown(txt):
-        """去除文本中的 Markdown 格式符号"""
-        lines = []
-        for line in txt.split('\n'):
-            # 去掉标题符号 #### ### ## #
-            line = re.sub(r'^#{1,6}\s*', '', line)
-            # 去掉加粗 **text** 或 __text__
-            line = re.sub(r'\*\*(.+?)\*\*', r'\1', line)
-            line = re.sub(r'__(.+?)__', r'\1', line)
-            # 去掉斜体 *text* 或 _text_（但不影响 emoji 旁的 *）
-            line = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', r'\1', line)
-            # 去掉行内代码 `text`
-            line = re.sub(r'`(.+?)`', r'\1', line)
-            # 去掉列表符号 - 或 * 开头（保留内容）
-            line = re.sub(r'^\s*[-*]\s+', '• ', line)
-            # 去掉有序列表多余格式
-            line = re.sub(r'^\s*(\d+)\.\s+', r'\1. ', line)
-            lines.append(line)
-        return '\n'.join(lines)
-
-    text = strip_markdown(text)
+    # 清理 Markdown 后换行分页（相同正文 + 版式重复渲染时直接命中缓存）
+    pages = _paginate(text, font_size, line_spacing, content_width, content_height, max_pages)
     if title:
-        title = strip_markdown(title)
-
-    # 文本自动换行
-    def wrap_text(txt, fnt):
-        """将一行文本按宽度自动换行"""
-        lines = []
-        for raw_line in txt.split('\n'):
-            if not raw_line.strip():
-                lines.append('')
-                continue
-            current = ''
-            for char in raw_line:
-                test = current + char
-                bbox = fnt.getbbox(test) if hasattr(fnt, 'getbbox') else (0, 0, len(test) * font_size, font_size)
-                tw = bbox[2] - bbox[0]
-                if tw > content_width:
-                    lines.append(current)
-                    current = char
-                else:
-                    current = test
-            if current:
-                lines.append(current)
-        return lines
-
-    # 判断是否是小标题行（以 emoji 或数字序号开头，或全大写短行）
-    def is_heading(line):
-        s = line.strip()
-        if not s:
-            return False
-        # 数字序号开头：1. 2. ① ② 一、二、
-        if len(s) < 40 and (s[0].isdigit() or s[0] in '①②③④⑤⑥⑦⑧⑨⑩'):
-            return True
-        # 中文序号
-        if len(s) < 40 and s[0] in '一二三四五六七八九十':
-            return True
-        # 【】标题
-        if s.startswith('【') and '】' in s[:20]:
-            return True
-        return False
-
-    # 将所有文本换行并分页
-    all_lines = wrap_text(text, font)
-    pages = []
-    current_page_lines = []
-    current_y = 0
-
-    for line in all_lines:
-        needed = line_height + (8 if is_heading(line) and current_page_lines else 0)
-        if current_y + needed > content_height and current_page_lines:
-            pages.append(current_page_lines)
-            current_page_lines = []
-            current_y = 0
-        if is_heading(line) and current_page_lines:
-            current_y += 8  # 小标题前额外间距
-        current_page_lines.append(line)
-        current_y += line_height
-
-    if current_page_lines:
-        pages.append(current_page_lines)
-
-    # 限制最大页数
-    if len(pages) > max_pages:
-        pages = pages[:max_pages]
-        # 最后一页末尾加省略提示
-        pages[-1].append('')
-        pages[-1].append('...(更多内容请关注后续更新)')
+        title = _strip_markdown(title)
 
     # 加载标题字体（比正文大）
     title_font = None
     if title:
-        title_font_size = font_size + 12
-        for fp in font_paths:
-            if os.path.exists(fp):
-                try:
-                    title_font = ImageFont.truetype(fp, title_font_size)
-                    break
-                except Exception:
-                    continue
-        if not title_font:
-            title_font = bold_font
-
-    # 渲染每页
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_paths = []
+        title_font = _load_font(font_size + 12) or bold_font
 
+    # 页码字体
+    page_font = _load_font(max(font_size - 8, 20)) or font
+
+    # 渲染每页（各页独立的 Image，互不共享可变状态；Pillow 绘制/编码时释放 GIL，多线程可并行）
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
     total_pages = len(pages)
-    for i, page_lines in enumerate(pages):
-        img = Image.new('RGB', (width, height), bg_color)
+
+    # 各页相同的部分（底色、底部装饰线）只画一次，每页复制底图；AI 水印最后画，保持在正文之上
+    base = Image.new('RGB', (width, height), bg_color)
+    base_draw = ImageDraw.Draw(base)
+    line_y = height - pad_bottom + 20
+    base_draw.line([(pad_left, line_y), (width - pad_right, line_y)], fill='#E0D5CF', width=1)
+
+    # 页码以右上角为锚点右对齐（"1/10" 与 "10/10" 宽度不同），纵向位置只量一次：各页页码字高相同
+    pbbox = base_draw.textbbox((0, 0), f'{total_pages}/{total_pages}', font=page_font)
+    page_xy = (width - pad_right, pad_top // 2 - (pbbox[3] - pbbox[1]) // 2)
+
+    def render_page(i, page_lines):
+        """渲染单页并保存，返回图片路径"""
+        img = base.copy()
         draw = ImageDraw.Draw(img)
 
         # 页码（右上角）
-        page_text = f'{i + 1}/{total_pages}'
-        page_font_size = max(font_size - 8, 20)
-        try:
-            page_font = ImageFont.truetype(font_paths[0] if os.path.exists(font_paths[0]) else font_paths[-1], page_font_size)
-        except Exception:
-            page_font = font
-        pbbox = draw.textbbox((0, 0), page_text, font=page_font)
-        draw.text(
-            (width - pad_right - (pbbox[2] - pbbox[0]), pad_top // 2 - (pbbox[3] - pbbox[1]) // 2),
-            page_text, fill='#AAAAAA', font=page_font
-        )
+        draw.text(page_xy, f'{i + 1}/{total_pages}', fill='#AAAAAA', font=page_font, anchor='ra')
 
         # 渲染文本行
         y = pad_top
@@ -544,7 +577,7 @@ def render_text_pages(text, output_dir, prefix='text_page',
         # 第一页显示标题
         if i == 0 and title and title_font:
             # 标题自动换行
-            title_lines = wrap_text(title, title_font)
+            title_lines = _wrap_text(title, title_font, content_width, font_size)
             for tl in title_lines:
                 draw.text((pad_left, y), tl, fill='#1A1A1A', font=title_font)
                 y += int((font_size + 12) * line_spacing)
@@ -553,43 +586,144 @@ def render_text_pages(text, output_dir, prefix='text_page',
             draw.line([(pad_left, y), (width - pad_right, y)], fill='#E0D5CF', width=2)
             y += 20
 
-        for line in page_lines:
-            if is_heading(line):
+        for line, heading in page_lines:
+            if heading:
                 y += 4
                 draw.text((pad_left, y), line, fill=text_color, font=bold_font)
             else:
                 draw.text((pad_left, y), line, fill=text_color, font=font)
             y += line_height
 
-        # 底部装饰线
-        line_y = height - pad_bottom + 20
-        draw.line([(pad_left, line_y), (width - pad_right, line_y)], fill='#E0D5CF', width=1)
-
-        # AI 水印
-        _add_ai_watermark_to_draw(draw, img.size, font_paths)
+        # AI 水印（画在正文之后，不被文字遮挡）
+        _add_ai_watermark_to_draw(draw, img.size)
 
         out_path = str(output_dir / f'{prefix}_{ts}_{i + 1}.png')
-        img.save(out_path, quality=95)
-        output_paths.append(out_path)
+        # 纯色底文字图保持 PNG（文字边缘无 JPEG 振铃），用快速压缩档；quality 对 PNG 无效
+        img.save(out_path, 'PNG', compress_level=1)
+        return out_path
+
+    workers = min(total_pages, os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            output_paths = list(pool.map(render_page, range(total_pages), pages))
+    else:
+        output_paths = [render_page(i, page_lines) for i, page_lines in enumerate(pages)]
 
     print(f'[图片生成] 文字排版完成: {len(output_paths)} 页', file=sys.stderr)
     return output_paths
 
 
-def _add_ai_watermark_to_draw(draw, img_size, font_paths):
+# Markdown 清理规则（按顺序应用）
+_MD_RULES = (
+    # 标题符号 #### ### ## #
+    (re.compile(r'^#{1,6}\s*'), ''),
+    # 加粗 **text**
+    (re.compile(r'\*\*(.+?)\*\*'), r'\1'),
+    # 加粗 __text__
+    (re.compile(r'__(.+?)__'), r'\1'),
+    # 斜体 *text*（不影响 emoji 旁的 *）
+    (re.compile(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)'), r'\1'),
+    # 行内代码 `text`
+    (re.compile(r'`(.+?)`'), r'\1'),
+    # 列表符号 - 或 * 开头（保留内容）
+    (re.compile(r'^\s*[-*]\s+'), '• '),
+    # 有序列表多余格式
+    (re.compile(r'^\s*(\d+)\.\s+'), r'\1. '),
+)
+
+
+def _strip_markdown(txt):
+    """去除文本中的 Markdown 格式符号"""
+    lines = []
+    for line in txt.split('\n'):
+        for pattern, repl in _MD_RULES:
+            line = pattern.sub(repl, line)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+@lru_cache(maxsize=16)
+def _paginate(text, font_size, line_spacing, content_width, content_height, max_pages):
+    """
+    清理 Markdown、换行并分页（结果缓存，重试/换引擎重渲染时复用）
+
+    Returns:
+        tuple: 每页为 ((行文本, 是否小标题), ...)
+    """
+    font = _load_font(font_size) or ImageFont.load_default()
+    line_height = int(font_size * line_spacing)
+
+    # 每行只判定一次是否小标题，渲染时直接复用
+    pages = []
+    current_page_lines = []
+    current_y = 0
+    for line in _wrap_text(_strip_markdown(text), font, content_width, font_size):
+        heading = _is_heading(line)
+        needed = line_height + (8 if heading and current_page_lines else 0)
+        if current_y + needed > content_height and current_page_lines:
+            pages.append(tuple(current_page_lines))
+            current_page_lines = []
+            current_y = 0
+        if heading and current_page_lines:
+            current_y += 8  # 小标题前额外间距
+        current_page_lines.append((line, heading))
+        current_y += line_height
+
+    if current_page_lines:
+        pages.append(tuple(current_page_lines))
+
+    # 限制最大页数
+    if len(pages) > max_pages:
+        pages = pages[:max_pages]
+        # 最后一页末尾加省略提示
+        pages[-1] += (('', False), ('...(更多内容请关注后续更新)', False))
+
+    return tuple(pages)
+
+
+def _wrap_text(txt, fnt, content_width, font_size):
+    """将文本按宽度自动换行（整行先量一次，超宽再二分查找断点）"""
+    measure = getattr(fnt, 'getlength', None) or (lambda s: len(s) * font_size)
+    lines = []
+    for raw_line in txt.split('\n'):
+        if not raw_line.strip():
+            lines.append('')
+            continue
+        rest = raw_line
+        while rest:
+            if measure(rest) <= content_width:
+                lines.append(rest)
+                break
+            # 最长的放得下的前缀，至少保留 1 个字符保证前进
+            lo, hi = 1, len(rest) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if measure(rest[:mid]) <= content_width:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            lines.append(rest[:lo])
+            rest = rest[lo:]
+    return lines
+
+
+def _is_heading(line):
+    """判断是否是小标题行（数字/中文序号开头的短行，或【】标题）"""
+    s = line.strip()
+    if not s:
+        return False
+    # 序号开头：1. 2. ① ② 一、二、
+    if len(s) < 40 and (s[0] in _HEADING_CHARS or s[0].isdigit()):
+        return True
+    # 【】标题
+    return _BRACKET_RE.match(s) is not None
+
+
+def _add_ai_watermark_to_draw(draw, img_size):
     """在 ImageDraw 上直接绘制 AI 水印（用于文字排版图片，避免重复打开文件）"""
     w, h = img_size
     min_side = min(w, h)
-    wm_font_size = max(int(min_side * 0.035), 14)
-
-    wm_font = None
-    for fp in font_paths:
-        if os.path.exists(fp):
-            try:
-                wm_font = ImageFont.truetype(fp, wm_font_size)
-                break
-            except Exception:
-                continue
+    wm_font = _load_font(max(int(min_side * 0.035), 14))
 
     text = 'AI生成'
     bbox = draw.textbbox((0, 0), text, font=wm_font)
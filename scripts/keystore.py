@@ -11,6 +11,7 @@ import json
 import os
 import sys
 import getpass
+from functools import lru_cache
 from pathlib import Path
 
 try:
@@ -21,13 +22,42 @@ try:
 except ImportError:
     HAS_CRYPTO = False
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 SKILL_DIR = Path(__file__).parent.parent
 KEYS_FILE = SKILL_DIR / 'keys.enc'
 SALT_FILE = SKILL_DIR / '.salt'
 
+# KDF 版本 → (哈希算法名, 迭代次数)
+# v1: 旧版 PBKDF2-SHA256 48 万次（keys.enc 无版本前缀）
+# v2: PBKDF2-SHA512 21 万次（OWASP 推荐强度，耗时约为 v1 的一半）
+_KDF_PARAMS = {
+    1: ('SHA256', 480000),
+    2: ('SHA512', 210000),
+}
+KDF_VERSION = 2
+# keys.enc 版本前缀（Fernet token 以 gAAAAA 开头，不会冲突）
+_VERSION_PREFIX = b'v%d:'
+
+# 进程内缓存：机器指纹和盐值在进程生命周期内不会变化
+_MACHINE_ID = None
+_SALT = None
+
 
 def _get_machine_id():
-    """获取机器指纹作为盐的一部分"""
+    """获取机器指纹作为盐的一部分（进程内缓存）"""
+    global _MACHINE_ID
+    if _MACHINE_ID is None:
+        _MACHINE_ID = _read_machine_id()
+    return _MACHINE_ID
+
+
+def _read_machine_id():
+    """读取机器指纹"""
     candidates = [
         '/etc/machine-id',
         '/var/lib/dbus/machine-id',
@@ -42,34 +72,56 @@ def _get_machine_id():
 
 
 def _get_salt():
-    """获取或生成盐值"""
-    if SALT_FILE.exists():
-        return SALT_FILE.read_bytes()
-    salt = os.urandom(16)
-    SALT_FILE.write_bytes(salt)
-    SALT_FILE.chmod(0o600)
-    return salt
+    """获取或生成盐值（进程内缓存）"""
+    global _SALT
+    if _SALT is None:
+        if SALT_FILE.exists():
+            _SALT = SALT_FILE.read_bytes()
+        else:
+            salt = os.urandom(16)
+            SALT_FILE.write_bytes(salt)
+            SALT_FILE.chmod(0o600)
+            _SALT = salt
+    return _SALT
 
 
-def _derive_key(password=''):
+def _derive_key(password='', version=KDF_VERSION):
     """从密码 + 机器指纹派生加密密钥"""
     if not HAS_CRYPTO:
         raise RuntimeError('需要安装 cryptography: pip3 install cryptography')
+    return _fernet_for(password, _get_salt(), _get_machine_id(), version)
 
-    machine_id = _get_machine_id()
-    combined = f'{password}:{machine_id}'.encode()
-    salt = _get_salt()
 
+@lru_cache(maxsize=4)
+def _fernet_for(password, salt, machine_id, version):
+    """
+    按 KDF 版本做 PBKDF2 派生并构造 Fernet
+    按 (密码, 盐, 机器指纹, 版本) 缓存，同一进程内多次加解密只做一次 KDF
+    """
+    algorithm, iterations = _KDF_PARAMS[version]
+    combined = f'{password}:{machine_id}'.encode()
     kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
+        algorithm=getattr(hashes, algorithm)(),
         length=32,
         salt=salt,
-        iterations=480000,
+        iterations=iterations,
     )
     key = base64.urlsafe_b64encode(kdf.derive(combined))
     return Fernet(key)
 
 
+def _loads(raw):
+    """解析 JSON 字节串（优先 orjson）"""
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(data):
+    """序列化为紧凑的 UTF-8 JSON 字节串（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
 def encrypt_keys(keys_dict, password=''):
     """
     加密 API Key 字典并保存到 keys.enc
@@ -79,10 +131,10 @@ def encrypt_keys(keys_dict, password=''):
         password: 可选密码（空则仅依赖机器指纹）
     """
     fernet = _derive_key(password)
-    plaintext = json.dumps(keys_dict, ensure_ascii=False).encode()
+    plaintext = _dumps(keys_dict)
     encrypted = fernet.encrypt(plaintext)
 
-    KEYS_FILE.write_bytes(encrypted)
+    KEYS_FILE.write_bytes(_VERSION_PREFIX % KDF_VERSION + encrypted)
     KEYS_FILE.chmod(0o600)
     return str(KEYS_FILE)
 
@@ -100,10 +152,19 @@ def decrypt_keys(password=''):
     if not KEYS_FILE.exists():
         raise FileNotFoundError(f'加密文件不存在: {KEYS_FILE}')
 
-    fernet = _derive_key(password)
-    encrypted = KEYS_FILE.read_bytes()
+    version, encrypted = _split_version(KEYS_FILE.read_bytes())
+    fernet = _derive_key(password, version)
     plaintext = fernet.decrypt(encrypted)
-    return json.loads(plaintext.decode())
+    return _loads(plaintext)
+
+
+def _split_version(data):
+    """拆出 keys.enc 的 KDF 版本前缀；无前缀的是 v1 旧文件（下次写入时自动升级）"""
+    if data.startswith(b'v'):
+        head, sep, rest = data.partition(b':')
+        if sep and head[1:].isdigit() and int(head[1:]) in _KDF_PARAMS:
+            return int(head[1:]), rest
+    return 1, data
 
 
 def get_api_key(key_name, password=''):
@@ -216,6 +277,7 @@ def main():
         print(json.dumps({
             'encrypted_file_exists': KEYS_FILE.exists(),
             'encrypted_file': str(KEYS_FILE),
+            'kdf_version': _split_version(KEYS_FILE.read_bytes())[0] if KEYS_FILE.exists() else None,
             'has_cryptography': HAS_CRYPTO,
             'salt_exists': SALT_FILE.exists(),
         }, ensure_ascii=False, indent=2))
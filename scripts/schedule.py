@@ -5,50 +5,110 @@
 任务数据持久化到本地 JSON，同时通过 OpenClaw cron API 管理实际调度。
 """
 
+import os
+import copy
 import json
 import sys
 import time
+import tempfile
 import hashlib
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 SKILL_DIR = Path(__file__).parent.parent
 SCHEDULE_FILE = SKILL_DIR / 'content' / 'schedules.json'
 SCHEDULE_FILE.parent.mkdir(exist_ok=True)
 
+# 进程内缓存：schedules.json 的 mtime/size 未变时直接复用已解析的数据和原始字节
+_CACHE = {'mtime': None, 'size': None, 'data': None, 'raw': None}
+
+# 风格 ID → 展示名称
+_STYLE_NAMES = {
+    'default': '通用',
+    'review': '测评种草',
+    'tutorial': '干货教程',
+    'daily': '日常分享',
+}
+
+
+def _loads(raw):
+    """解析 JSON 字节串（优先 orjson）"""
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(data):
+    """序列化为缩进 2 格的 UTF-8 JSON 字节串（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _cache_matches(st):
+    """缓存是否对应当前磁盘文件"""
+    return (_CACHE['data'] is not None
+            and _CACHE['mtime'] == st.st_mtime_ns
+            and _CACHE['size'] == st.st_size)
+
+
+def _update_cache(st, data, raw):
+    """用最新的文件状态和数据刷新缓存"""
+    _CACHE['mtime'] = st.st_mtime_ns
+    _CACHE['size'] = st.st_size
+    _CACHE['data'] = copy.deepcopy(data)
+    _CACHE['raw'] = raw
+
 
 def _load_schedules():
-    """加载本地定时任务列表"""
-    if not SCHEDULE_FILE.exists():
+    """加载本地定时任务列表（按 mtime + size 命中进程内缓存）"""
+    try:
+        st = SCHEDULE_FILE.stat()
+    except FileNotFoundError:
         return {}
+    if _cache_matches(st):
+        # 返回副本，调用方修改不会污染缓存
+        return copy.deepcopy(_CACHE['data'])
     try:
-        with open(SCHEDULE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(SCHEDULE_FILE, 'rb') as f:
+            raw = f.read()
+        data = _loads(raw)
     except Exception:
         return {}
+    _update_cache(st, data, raw)
+    return data
 
 
 def _save_schedules(data):
-    """保存定时任务列表"""
-    with open(SCHEDULE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """保存定时任务列表（内容未变则跳过；临时文件 + os.replace 原子替换）"""
+    raw = _dumps(data)
+    try:
+        if raw == _CACHE['raw'] and _cache_matches(SCHEDULE_FILE.stat()):
+            return
+    except FileNotFoundError:
+        pass
+    with tempfile.NamedTemporaryFile('wb', dir=SCHEDULE_FILE.parent, suffix='.tmp', delete=False) as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, SCHEDULE_FILE)
+    _update_cache(SCHEDULE_FILE.stat(), data, raw)
 
 
 def _gen_id(topic, style):
     text = f"{topic}_{style}_{time.time()}"
-    return 'xhs_' + hashlib.md5(text.encode()).hexdigest()[:8]
+    return 'xhs_' + hashlib.blake2b(text.encode(), digest_size=4).hexdigest()
 
 
 def _build_cron_message(topic, style='default', extra='', headless=True):
     """构建 cron agentTurn 的 message 文本"""
     parts = [f'发布一篇小红书笔记，主题是「{topic}」']
     if style != 'default':
-        style_names = {
-            'review': '测评种草',
-            'tutorial': '干货教程',
-            'daily': '日常分享',
-        }
-        parts.append(f'使用{style_names.get(style, style)}风格')
+        parts.append(f'使用{_STYLE_NAMES.get(style, style)}风格')
     if extra:
         parts.append(f'额外要求：{extra}')
     if headless:
@@ -236,11 +296,7 @@ def format_task_summary(task):
         sched = f"每 {task['every_minutes']} 分钟"
 
     status = '✅ 启用' if task.get('enabled', True) else '⏸️ 暂停'
-    style_names = {
-        'default': '通用', 'review': '测评种草',
-        'tutorial': '干货教程', 'daily': '日常分享',
-    }
-    style_label = style_names.get(task.get('style', 'default'), task.get('style', ''))
+    style_label = _STYLE_NAMES.get(task.get('style', 'default'), task.get('style', ''))
 
     return (
         f"[{task['task_id']}] {status} | {task.get('name', task['topic'])}\n"
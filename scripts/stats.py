@@ -4,27 +4,125 @@
 基于 logs/report_*.json 汇总发布历史、成功率、标签分布等
 """
 
+import os
 import json
+import heapq
 import sys
+import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 LOGS_DIR = Path(__file__).parent.parent / 'logs'
+# 已解析报告的持久化缓存：{文件名: [mtime_ns, size, 报告数据]}
+REPORT_CACHE_FILE = LOGS_DIR / '.reports_cache.json'
+
+# 未命中缓存的报告超过该数量时并行解析
+PARSE_PARALLEL_MIN = 16
+
+# 进程内缓存（首次加载时从 REPORT_CACHE_FILE 填充）
+_REPORT_CACHE = None
+
+
+def _loads(raw):
+    """解析 JSON 字节串（优先 orjson）"""
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(data):
+    """序列化为紧凑的 UTF-8 JSON 字节串（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _load_report_cache():
+    """读取报告缓存（进程内只读一次磁盘）"""
+    global _REPORT_CACHE
+    if _REPORT_CACHE is None:
+        try:
+            with open(REPORT_CACHE_FILE, 'rb') as fh:
+                _REPORT_CACHE = _loads(fh.read())
+        except (ValueError, IOError):
+            _REPORT_CACHE = {}
+    return _REPORT_CACHE
+
+
+def _save_report_cache(cache):
+    """原子写回报告缓存；写失败不影响统计"""
+    try:
+        with tempfile.NamedTemporaryFile('wb', dir=LOGS_DIR, suffix='.tmp', delete=False) as fh:
+            fh.write(_dumps(cache))
+        os.replace(fh.name, REPORT_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def _parse_report(path):
+    """读取并解析单个报告文件，失败返回 None"""
+    try:
+        with open(path, 'rb') as fh:
+            return _loads(fh.read())
+    except (ValueError, IOError):
+        # orjson.JSONDecodeError / json.JSONDecodeError 都是 ValueError 子类
+        return None
 
 
 def load_reports():
-    """加载所有发布报告"""
-    reports = []
+    """
+    加载所有发布报告
+    报告写入后不再修改，按 (mtime, size) 命中缓存，只解析新增或变动的文件；
+    未命中的文件较多时用线程池并行读取解析
+    """
+    cache = _load_report_cache()
+    slots = []     # 按文件名顺序：缓存命中为报告数据，未命中为 None
+    misses = []    # (slots 下标, 路径, stat)
+    seen = set()
     for f in sorted(LOGS_DIR.glob('report_*.json')):
         try:
-            with open(f, 'r', encoding='utf-8') as fh:
-                data = json.load(fh)
-                data['_file'] = f.name
-                reports.append(data)
-        except (json.JSONDecodeError, IOError):
+            st = f.stat()
+        except OSError:
             continue
-    return reports
+        seen.add(f.name)
+        entry = cache.get(f.name)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            slots.append(entry[2])
+        else:
+            misses.append((len(slots), f, st))
+            slots.append(None)
+
+    dirty = False
+    if misses:
+        paths = [f for _, f, _ in misses]
+        if len(paths) > PARSE_PARALLEL_MIN:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                parsed = list(pool.map(_parse_report, paths))
+        else:
+            parsed = [_parse_report(f) for f in paths]
+        for (idx, f, st), data in zip(misses, parsed):
+            if data is None:
+                continue
+            data['_file'] = f.name
+            cache[f.name] = [st.st_mtime_ns, st.st_size, data]
+            slots[idx] = data
+            dirty = True
+
+    # 清理已删除报告的缓存项
+    for name in [n for n in cache if n not in seen]:
+        del cache[name]
+        dirty = True
+    if dirty:
+        _save_report_cache(cache)
+    return [r for r in slots if r is not None]
 
 
 def filter_by_date(reports, days=None, date_str=None):
@@ -41,12 +139,19 @@ def filter_by_date(reports, days=None, date_str=None):
 def _parse_time(report):
     """解析报告时间"""
     t = report.get('time', '')
-    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
-        try:
-            return datetime.strptime(t, fmt)
-        except ValueError:
-            continue
-    return datetime.min
+    return _parse_iso(t) if isinstance(t, str) else datetime.min
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(t):
+    """解析 ISO 时间字符串（缓存）；带时区的转成本地时间，无法解析返回 datetime.min"""
+    try:
+        dt = datetime.fromisoformat(t)
+    except ValueError:
+        return datetime.min
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
 
 
 def summary(reports):
@@ -54,43 +159,41 @@ def summary(reports):
     if not reports:
         return {"total": 0, "message": "暂无发布记录"}
 
+    # 单次遍历完成所有统计，每条报告只解析一次时间
     total = len(reports)
-    success = sum(1 for r in reports if r.get('result', {}).get('success'))
-    failed = total - success
-    rate = round(success / total * 100, 1) if total else 0
-
-    # 标签统计
-    all_tags = []
+    success = 0
+    len_sum = 0
+    tag_counter = Counter()
+    daily = Counter()
+    timed = []
+    errors = []
     for r in reports:
-        all_tags.extend(r.get('tags', []))
-    top_tags = Counter(all_tags).most_common(10)
+        result = r.get('result', {})
+        if result.get('success'):
+            success += 1
+        tag_counter.update(r.get('tags', ()))
+        len_sum += r.get('content_length', 0)
+        t = _parse_time(r)
+        daily[t.strftime('%Y-%m-%d')] += 1
+        timed.append((t, r))
+        err = result.get('error')
+        if err:
+            errors.append({"time": r.get('time', ''), "title": r.get('title', ''), "error": err})
 
-    # 内容长度统计
-    lengths = [r.get('content_length', 0) for r in reports]
-    avg_len = round(sum(lengths) / len(lengths)) if lengths else 0
+    failed = total - success
+    rate = round(success / total * 100, 1) if total else 0
+    top_tags = tag_counter.most_common(10)
+    avg_len = round(len_sum / total) if total else 0
 
-    # 按日期分组
-    daily = Counter()
-    for r in reports:
-        day = _parse_time(r).strftime('%Y-%m-%d')
-        daily[day] += 1
-
-    # 最近发布
-    latest = sorted(reports, key=_parse_time, reverse=True)[:5]
-    recent = []
-    for r in latest:
-        recent.append({
+    # 最近发布（nlargest 与 sorted(reverse=True)[:5] 结果一致）
+    recent = [
+        {
             "time": r.get('time', ''),
             "title": r.get('title', ''),
             "success": r.get('result', {}).get('success', False)
-        })
-
-    # 错误汇总
-    errors = []
-    for r in reports:
-        err = r.get('result', {}).get('error')
-        if err:
-            errors.append({"time": r.get('time', ''), "title": r.get('title', ''), "error": err})
+        }
+        for _, r in heapq.nlargest(5, timed, key=itemgetter(0))
+    ]
 
     return {
         "total": total,
@@ -23,14 +23,18 @@ _PLATFORMS = [
 ]
 
 
+# 版本 × 平台的完整 UA 在导入时拼好（均匀组合，与分别随机选取的分布一致）
+_USER_AGENTS = tuple(
+    f'Mozilla/5.0 ({platform}) AppleWebKit/537.36 '
+    f'(KHTML, like Gecko) Chrome/{chrome_ver} Safari/537.36'
+    for chrome_ver in _CHROME_VERSIONS
+    for platform, _ in _PLATFORMS
+)
+
+
 def random_user_agent():
     """生成随机但合理的 Chrome UA"""
-    chrome_ver = random.choice(_CHROME_VERSIONS)
-    platform, _ = random.choice(_PLATFORMS)
-    return (
-        f'Mozilla/5.0 ({platform}) AppleWebKit/537.36 '
-        f'(KHTML, like Gecko) Chrome/{chrome_ver} Safari/537.36'
-    )
+    return random.choice(_USER_AGENTS)
 
 
 # ─── Viewport 随机化 ────────────────────────────────────────
@@ -116,6 +120,16 @@ delete window.__pw_manual;
 '''
 
 
+def _minify_js(js):
+    """去掉整行 // 注释、缩进和空行（保留换行，不依赖分号也不会改变语义）"""
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+# 导入时预先压缩一次，每个新页面注入时直接复用
+_STEALTH_JS_MIN = _minify_js(STEALTH_JS)
+
+
 def get_stealth_args():
     """返回 Chromium 启动参数（反检测）"""
     return [
@@ -145,5 +159,5 @@ def apply_stealth(context):
     对浏览器上下文注入反检测脚本。
     在每个新页面创建时自动执行。
     """
-    context.add_init_script(STEALTH_JS)
+    context.add_init_script(_STEALTH_JS_MIN)
     return context
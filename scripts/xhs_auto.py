@@ -568,7 +568,7 @@ def _auto_generate_multi_images(title, content, count=3, cover_template=None):
     """
     count = max(1, min(9, count))
     sys.path.insert(0, str(Path(__file__).parent))
-    from image_gen import generate_image
+    from image_gen import generate_images_batch
 
     # 拆分内容段落
     sections = _split_content_sections(content)
@@ -598,27 +598,28 @@ def _auto_generate_multi_images(title, content, count=3, cover_template=None):
             f"要求：高质量、3:4竖版构图、与内容相关、风格统一、不要包含文字"
         )
 
-    # 逐张生成
-    generated = []
+    # 并发生成（并发数有上限，避免触发 API 速率限制）
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    jobs = []
     for idx, prompt in enumerate(prompts):
         suffix = 'cover' if idx == 0 else f'page{idx}'
-        output_path = str(CONTENT_DIR / f'ai_{suffix}_{ts}.png')
-        log.info(f'生成第 {idx+1}/{count} 张图片...')
-        try:
+        jobs.append({
+            'prompt': prompt,
+            'output_path': str(CONTENT_DIR / f'ai_{suffix}_{ts}.png'),
             # 第一张使用封面模板（如果指定）
-            template = cover_template if idx == 0 else None
-            result = generate_image(prompt, output_path, resolution='1K', cover_template=template, title=title)
-            if result['success']:
-                generated.append(output_path)
-                log.info(f'  ✓ 第 {idx+1} 张成功 [{result["engine"]}]: {output_path}')
-            else:
-                log.warning(f'  ✗ 第 {idx+1} 张失败: {result.get("error", "未知")}')
-        except Exception as e:
-            log.warning(f'  ✗ 第 {idx+1} 张异常: {e}')
-        # 请求间隔，避免触发 API 速率限制
-        if idx < len(prompts) - 1:
-            time.sleep(5)
+            'cover_template': cover_template if idx == 0 else None,
+            'title': title,
+        })
+    log.info(f'并发生成 {len(jobs)} 张图片...')
+    results = generate_images_batch(jobs, resolution='1K')
+
+    generated = []
+    for idx, (job, result) in enumerate(zip(jobs, results)):
+        if result['success']:
+            generated.append(job['output_path'])
+            log.info(f'  ✓ 第 {idx+1} 张成功 [{result["engine"]}]: {job["output_path"]}')
+        else:
+            log.warning(f'  ✗ 第 {idx+1} 张失败: {result.get("error", "未知")}')
 
     log.info(f'多图生成完成: {len(generated)}/{count} 张成功')
     return generated
@@ -1126,12 +1127,12 @@ def cmd_comments(args):
 def cmd_engagement(args):
     """笔记互动数据"""
     sys.path.insert(0, str(Path(__file__).parent))
-    from engagement import fetch_note_engagement, generate_daily_report, format_daily_report, _load_engagement_db
+    from engagement import fetch_note_engagement, generate_daily_report, format_daily_report, _latest_snapshot
 
     if args.engagement_action == 'cached':
-        db = _load_engagement_db()
-        if db.get('snapshots'):
-            print(json.dumps(db['snapshots'][-1], ensure_ascii=False, indent=2))
+        latest = _latest_snapshot()
+        if latest:
+            print(json.dumps(latest, ensure_ascii=False, indent=2))
         else:
             print(json.dumps({"message": "暂无缓存数据"}, ensure_ascii=False))
         return